@@ -23,6 +23,79 @@ def register_cli(app):
     app.cli.add_command(plugin_cli)
 
 
+def load_permission_registry(app):
+    """
+    启动时编译权限位图并序列化权限目录，数据表尚未初始化时跳过，首次使用时再构建
+    """
+    from sqlalchemy.exc import DatabaseError
+
+    from app.extension.permission.cache import permission_cache
+    from app.extension.permission.catalogue import permission_catalogue
+
+    with app.app_context():
+        try:
+            permission_cache.warm()
+            permission_catalogue.ensure()
+        except DatabaseError:
+            pass
+
+
+def register_jwt(app):
+    """
+    需在 Lin 初始化之后注册，以覆盖 Lin 设置的用户加载函数
+    """
+    from app.extension.permission.jwt import init_app
+
+    init_app(app)
+
+
+def register_log(app):
+    from app.extension.count.cache import count_cache
+    from app.extension.log.export import log_exporter
+    from app.extension.log.partition import log_partitions
+    from app.extension.log.rollup import log_rollup
+    from app.extension.log.search import log_search
+    from app.extension.log.usernames import log_usernames
+    from app.extension.log.writer import log_writer
+
+    log_writer.init_app(app)
+    log_search.init_app(app)
+    log_usernames.init_app(app)
+    log_exporter.init_app(app)
+    log_rollup.init_app(app)
+    log_partitions.init_app(app)
+
+    # 行为日志不经过 session 写入，批量写入后使日志总数缓存失效
+    @log_writer.on_flush
+    def invalidate_log_count(conn, rows):
+        count_cache.invalidate("lin_log")
+
+
+def register_user_importer(app):
+    from app.extension.user.importer import user_importer
+
+    user_importer.init_app(app)
+
+
+def register_json_encoder(app):
+    """
+    需在 Lin 初始化之后注册，以覆盖 Lin 设置的 json_encoder 与 make_response
+    """
+    from app.extension.serializer.encoder import compiled_encoder
+
+    compiled_encoder.init_app(app)
+
+
+def register_compressor(app):
+    """
+    需在 Lin 初始化之前注册：after_request 按注册的逆序执行，
+    压缩须在 Lin 按响应 schema 重新生成响应之后进行
+    """
+    from app.extension.compress.compressor import compressor
+
+    compressor.init_app(app)
+
+
 def register_api(app):
     from lin.apidoc import api
 
@@ -70,6 +143,12 @@ def create_app(register_all=True, **kwargs):
         register_blueprints(app)
         register_api(app)
         apply_cors(app)
+        register_compressor(app)
         Lin(app, **kwargs)
+        register_json_encoder(app)
+        register_jwt(app)
+        load_permission_registry(app)
+        register_log(app)
+        register_user_importer(app)
         register_cli(app)
     return app
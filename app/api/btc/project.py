@@ -1,33 +1,52 @@
 from lin.redprint import Redprint
-from lin.exception import NotFound, Success
+from lin.exception import NotFound, ParameterError, Success
 from lin.apidoc import api
 from app.model.btc import project
 from app.model.btc.project import BtcProject
+from app.extension.cache.conditional import conditional, row_version, table_version
+from app.extension.cache.response import response_cache
+from app.extension.count.cache import count_cache
+from app.util.fields import get_fields_from_query, load_fields, select_fields
+from app.util.page import keyset_page
 from app.validator.project import BtcProjectQuerySearchSchema, BtcProjectSchema
 from flask import g, request
 
 
 project_api = Redprint('project')
 
+# 列表的排序方式 -> 排序键，排序键的最后一列唯一
+SORT_KEYS = {
+    "id": [BtcProject.id],
+    "rang": [BtcProject.rang, BtcProject.id],
+}
+# 首个排序键可能为 NULL 的排序方式，NULL 排在最后
+NULLABLE_SORTS = {"rang"}
+
 
 @project_api.route('/<int:id>')
+@conditional(row_version(BtcProject))
+@response_cache.cached([BtcProject.__table__.name])
 def get_project(id):
     # 在数据库中查询id=`id`, 且没有被软删除的项目
-    project = BtcProject.query.filter_by(id=id, delete_time=None).first()
+    # ?fields= / ?exclude= 指定的字段之外的列（如 detail、info_table）不会被查询
+    fields = get_fields_from_query(BtcProject)
+    project = load_fields(BtcProject.query, BtcProject, fields).filter_by(id=id, delete_time=None).first()
     if project:
-        return project # 如果存在，返回该数据的信息
+        return select_fields(project, fields) # 如果存在，返回该数据的信息
     raise NotFound('没有找到相关项目') 
 
 @project_api.route('/search', methods=['GET'])
 # 使用校验，需要引入定义好的对象`api`,它是Spectree的一个实例
 # query代表来自url中的参数，如`http://127.0.0.1:5000?q=abc&page=1`中的 `q` 和 `page`都属于query参数
 @api.validate(query=BtcProjectQuerySearchSchema)
+@response_cache.cached([BtcProject.__table__.name])
 def search_project():
     # 使用这种方式校验通过的参数将会被挂载到g的对应属性上，方便直接取用。
     q = '%' + g.q + '%' # 取出参数中的`q`参数，加`%`进行模糊查询
-    projects = BtcProject.query.filter(BtcProject.name.like(q), BtcProject.delete_time==None).all() # 搜索书籍标题
+    fields = get_fields_from_query(BtcProject)
+    projects = load_fields(BtcProject.query, BtcProject, fields).filter(BtcProject.name.like(q), BtcProject.delete_time==None).all() # 搜索书籍标题
     if projects:
-        return projects
+        return select_fields(projects, fields)
     raise NotFound('没有找到相关项目')
 
 @project_api.route("", methods=["POST"])
@@ -67,8 +86,29 @@ def delete_project(id: int):
     raise NotFound(10020)
 
 @project_api.route("")
+@conditional(table_version(BtcProject))
+@response_cache.cached([BtcProject.__table__.name])
 def get_projects():
     """
-    获取项目列表
+    分页获取项目列表，传入 cursor 时按游标翻页
+    sort=id（默认）按 id 正序；sort=rang 按排名正序，未设置排名的项目排在最后
     """
-    return BtcProject.get(one=False)
\ No newline at end of file
+    sort = request.args.get("sort", "id")
+    if sort not in SORT_KEYS:
+        raise ParameterError("sort 参数必须为 id 或 rang")
+    columns = SORT_KEYS[sort]
+    fields = get_fields_from_query(BtcProject)
+    projects = BtcProject.query.filter_by(delete_time=None)
+    total = count_cache.count(projects, "projects", (BtcProject.__table__.name,))
+    # 排序键需一并加载，生成游标时不再逐行查询
+    loaded = None
+    if fields is not None:
+        loaded = list(dict.fromkeys(fields + [c.name for c in columns]))
+    page = keyset_page(
+        load_fields(projects, BtcProject, loaded),
+        columns,
+        total,
+        nullable=sort in NULLABLE_SORTS,
+    )
+    select_fields(page["items"], fields)
+    return page
\ No newline at end of file
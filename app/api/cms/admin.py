@@ -7,15 +7,21 @@
 import math
 
 from flask import request
-from lin import find_user, get_ep_infos, manager, permission_meta
+from lin import find_user, manager, permission_meta
 from lin.db import db
 from lin.enums import GroupLevelEnum
 from lin.exception import Forbidden, NotFound, ParameterError, Success
-from lin.jwt import admin_required
-from lin.logger import Logger
 from lin.redprint import Redprint
 from sqlalchemy import func
 
+from app.extension.cache.response import response_cache
+from app.extension.count.cache import count_cache
+from app.extension.log.logger import Logger
+from app.extension.permission.cache import permission_cache
+from app.extension.permission.catalogue import permission_catalogue
+from app.extension.permission.groups import group_cache
+from app.extension.permission.jwt import admin_required
+from app.extension.user.importer import FORMAT_CSV, FORMAT_JSONL, user_importer
 from app.util.page import get_page_from_query, paginate
 from app.validator.form import (
     DispatchAuth,
@@ -34,7 +40,7 @@ admin_api = Redprint("admin")
 @permission_meta(name="查询所有可分配的权限", module="管理员", mount=False)
 @admin_required
 def permissions():
-    return get_ep_infos()
+    return permission_catalogue.response()
 
 
 @admin_api.route("/users")
@@ -43,67 +49,15 @@ def permissions():
 def get_admin_users():
     start, count = paginate()
     group_id = request.args.get("group_id")
-    # 根据筛选条件和分页，获取 用户id 与 用户组id 的一对多 数据
-    # 过滤root 分组
-    query_root_group_id = db.session.query(manager.group_model.id).filter(
-        manager.group_model.level == GroupLevelEnum.ROOT.value
+    # 用户及其分组（过滤root 分组）
+    users = manager.user_model.select_page_with_groups(start, count, group_id)
+    total = count_cache.count(
+        lambda: manager.user_model.count_with_groups(group_id),
+        "admin_users",
+        ("lin_user_group", "lin_group"),
+        dict(group_id=group_id),
+        estimate=False,
     )
-    _user_groups_list = db.session.query(
-        manager.user_group_model.user_id.label("user_id"),
-        func.group_concat(manager.user_group_model.group_id).label("group_ids"),
-    ).filter(~manager.user_group_model.group_id.in_(query_root_group_id))
-    if group_id:
-        _user_groups_list = _user_groups_list.filter(
-            manager.user_group_model.group_id == group_id
-        )
-    user_groups_list = (
-        _user_groups_list.group_by(manager.user_group_model.user_id)
-        .offset(start)
-        .limit(count)
-        .all()
-    )
-
-    # 获取 符合条件的 用户id 数量
-    # 过滤root 分组
-    _total = db.session.query(
-        func.count(func.distinct(manager.user_group_model.user_id))
-    ).filter(~manager.user_group_model.group_id.in_(query_root_group_id))
-    if group_id:
-        _total = _total.filter(manager.user_group_model.group_id == group_id)
-    total = _total.scalar()
-
-    # 获取本次需要返回的用户的数据
-    user_ids = [x.user_id for x in user_groups_list]
-    users = manager.user_model.query.filter(manager.user_model.id.in_(user_ids)).all()
-    user_dict = dict()
-    for user in users:
-        user.groups = list()
-        user._fields.append("groups")
-        user_dict[user.id] = user
-
-    # 使用用户组来过滤，则不需要补全用户组信息
-    if not group_id:
-        # 拿到本次请求返回用户的所有 用户组 id List
-        group_ids = [
-            int(i)
-            for i in set().union(*(x.group_ids.split(",") for x in user_groups_list))
-        ]
-        # 获取本次需要返回的用户组的数据
-        groups = manager.group_model.query.filter(
-            manager.group_model.id.in_(group_ids)
-        ).all()
-        group_dict = dict()
-        for group in groups:
-            group_dict[group.id] = group
-        items = []
-
-        # 根据 用户与用户组 一对多的关系， 补全用户的用户组详细信息
-        for user_id, group_ids in user_groups_list:
-            group_id_list = [int(gid) for gid in group_ids.split(",")]
-            groups = [group_dict[group_id] for group_id in group_id_list]
-            user_dict[user_id].groups = groups
-            items.append(user_dict[user_id])
-
     total_page = math.ceil(total / count)
     page = get_page_from_query()
     return {
@@ -115,6 +69,30 @@ def get_admin_users():
     }
 
 
+@admin_api.route("/users/batch", methods=["POST"])
+@permission_meta(name="批量导入用户", module="管理员", mount=False)
+@Logger(template="管理员批量导入了用户")  # 记录日志
+@admin_required
+def import_users():
+    """
+    批量导入用户，上传 csv / jsonl 文件（file 字段）或直接以请求体提交
+    """
+    upload = request.files.get("file")
+    if upload is not None:
+        text = upload.read().decode("utf-8")
+        filename = upload.filename or ""
+    else:
+        text = request.get_data(as_text=True)
+        filename = ""
+    fmt = request.args.get("format")
+    if fmt is None:
+        is_jsonl = filename.endswith((".jsonl", ".ndjson")) or "json" in (
+            request.mimetype or ""
+        )
+        fmt = FORMAT_JSONL if is_jsonl else FORMAT_CSV
+    return user_importer.run(user_importer.parse(text, fmt))
+
+
 @admin_api.route("/user/<int:uid>/password", methods=["PUT"])
 @permission_meta(name="修改用户密码", module="管理员", mount=False)
 @admin_required
@@ -148,6 +126,7 @@ def delete_user(uid):
             synchronize_session=False
         )
         user.hard_delete()
+    permission_cache.bump()
     return Success("操作成功")
 
 
@@ -167,21 +146,13 @@ def update_user(uid):
     with db.auto_commit():
         user.email = form.email.data
         group_ids = form.group_ids.data
-        # 清空原来的所有关联关系
-        manager.user_group_model.query.filter_by(user_id=user.id).delete(
-            synchronize_session=False
-        )
-        # 根据传入分组ids 新增关联记录
-        user_group_list = list()
         # 如果没传分组数据，则将其设定为 guest 分组
         if len(group_ids) == 0:
-            group_ids = [manager.group_model.get(level=GroupLevelEnum.GUEST.value).id]
-        for group_id in group_ids:
-            user_group = manager.user_group_model()
-            user_group.user_id = user.id
-            user_group.group_id = group_id
-            user_group_list.append(user_group)
-        db.session.add_all(user_group_list)
+            group_ids = [group_cache.guest_id]
+        # 只增删与原有分组有差异的关联记录
+        added, removed = manager.user_group_model.sync(user.id, group_ids)
+    if added or removed:
+        permission_cache.bump()
     return Success("操作成功")
 
 
@@ -201,19 +172,20 @@ def get_admin_groups():
     if groups is None:
         raise NotFound("不存在任何分组")
 
+    permissions = manager.permission_model.select_by_group_ids_grouped(
+        [group.id for group in groups]
+    )
     for group in groups:
-        permissions = manager.permission_model.select_by_group_id(group.id)
-        setattr(group, "permissions", permissions)
+        setattr(group, "permissions", permissions[group.id])
         group._fields.append("permissions")
 
     # root分组隐藏不显示
-    total = (
-        db.session.query(func.count(manager.group_model.id))
-        .filter(
-            manager.group_model.level != GroupLevelEnum.ROOT.value,
-            manager.group_model.delete_time == None,
-        )
-        .scalar()
+    _total = db.session.query(func.count(manager.group_model.id)).filter(
+        manager.group_model.level != GroupLevelEnum.ROOT.value,
+        manager.group_model.delete_time == None,
+    )
+    total = count_cache.count(
+        _total.scalar, "admin_groups", ("lin_group",), estimate=False
     )
     total_page = math.ceil(total / count)
     page = get_page_from_query()
@@ -247,8 +219,8 @@ def get_group(gid):
     group = manager.group_model.get(id=gid, one=True, soft=False)
     if group is None:
         raise NotFound("分组不存在")
-    permissions = manager.permission_model.select_by_group_id(gid)
-    setattr(group, "permissions", permissions)
+    permissions = manager.permission_model.select_by_group_ids_grouped([gid])
+    setattr(group, "permissions", permissions[gid])
     group._fields.append("permissions")
     return group
 
@@ -268,13 +240,8 @@ def create_group():
             info=form.info.data,
         )
         db.session.flush()
-        group_permission_list = list()
-        for permission_id in form.permission_ids.data:
-            gp = manager.group_permission_model()
-            gp.group_id = group.id
-            gp.permission_id = permission_id
-            group_permission_list.append(gp)
-        db.session.add_all(group_permission_list)
+        manager.group_permission_model.dispatch(group.id, form.permission_ids.data)
+    permission_cache.bump()
     return Success("新建分组成功")
 
 
@@ -298,11 +265,9 @@ def delete_group(gid):
     exist = manager.group_model.get(id=gid)
     if not exist:
         raise NotFound("分组不存在，删除失败")
-    guest_group = manager.group_model.get(level=GroupLevelEnum.GUEST.value)
-    root_group = manager.group_model.get(level=GroupLevelEnum.ROOT.value)
-    if gid in (guest_group.id, root_group.id):
+    if gid in (group_cache.guest_id, group_cache.root_id):
         raise Forbidden("不可删除此分组")
-    if manager.user_model.select_page_by_group_id(gid, root_group.id):
+    if manager.user_model.exists_by_group_id(gid):
         raise Forbidden("分组下存在用户，不可删除")
     with db.auto_commit():
         # 删除group id 对应的关联记录
@@ -311,6 +276,7 @@ def delete_group(gid):
         )
         # 删除group
         exist.delete()
+    permission_cache.bump()
     return Success("删除分组成功")
 
 
@@ -327,6 +293,7 @@ def dispatch_auth():
     manager.group_permission_model.create(
         group_id=form.group_id.data, permission_id=form.permission_id.data, commit=True
     )
+    permission_cache.bump()
     return Success("添加权限成功")
 
 
@@ -336,18 +303,26 @@ def dispatch_auth():
 def dispatch_auths():
     form = DispatchAuths().validate_for_api()
     with db.auto_commit():
-        for permission_id in form.permission_ids.data:
-            one = manager.group_permission_model.get(
-                group_id=form.group_id.data, permission_id=permission_id
-            )
-            if not one:
-                manager.group_permission_model.create(
-                    group_id=form.group_id.data,
-                    permission_id=permission_id,
-                )
+        manager.group_permission_model.dispatch(
+            form.group_id.data, form.permission_ids.data
+        )
+    permission_cache.bump()
     return Success("添加权限成功")
 
 
+@admin_api.route("/permission/replace", methods=["POST"])
+@permission_meta(name="替换分组权限", module="管理员", mount=False)
+@admin_required
+def replace_auths():
+    form = DispatchAuths().validate_for_api()
+    with db.auto_commit():
+        manager.group_permission_model.replace(
+            form.group_id.data, form.permission_ids.data
+        )
+    permission_cache.bump()
+    return Success("替换权限成功")
+
+
 @admin_api.route("/permission/remove", methods=["POST"])
 @permission_meta(name="删除多个权限", module="管理员", mount=False)
 @admin_required
@@ -359,5 +334,15 @@ def remove_auths():
             manager.group_permission_model.permission_id.in_(form.permission_ids.data),
             manager.group_permission_model.group_id == form.group_id.data,
         ).delete(synchronize_session=False)
-
+    permission_cache.bump()
     return Success("删除权限成功")
+
+
+@admin_api.route("/cache/stats")
+@permission_meta(name="查询响应缓存统计", module="管理员", mount=False)
+@admin_required
+def get_cache_stats():
+    """
+    本进程响应缓存的条目数、字节数及各路由的命中、未命中次数
+    """
+    return response_cache.stats()
@@ -1,16 +1,24 @@
 import math
+from datetime import datetime
 
-from flask import g
+from flask import Response, g, request
 from lin import permission_meta
 from lin.apidoc import DocResponse, api
-from lin.db import db
-from lin.jwt import group_required
 from lin.logger import Log
 from lin.redprint import Redprint
-from sqlalchemy import text
 
+from app.extension.count.cache import count_cache
+from app.extension.log.export import MIMETYPES, log_exporter
+from app.extension.log.partition import log_partitions
+from app.extension.log.rollup import log_rollup
+from app.extension.log.usernames import log_usernames
+from app.extension.permission.jwt import group_required
+from app.util.page import keyset_paginate
 from app.validator.schema import (
     AuthorizationSchema,
+    LogAnalyticsQuerySchema,
+    LogAnalyticsSchema,
+    LogExportSchema,
     LogPageSchema,
     LogQuerySearchSchema,
     UsernameListSchema,
@@ -33,20 +41,7 @@ def get_logs():
     """
     日志浏览查询（人员，时间, 关键字），分页展示
     """
-    logs = Log.query.filter()
-    total = logs.count()
-    items = (
-        logs.order_by(text("create_time desc")).offset(g.offset).limit(g.count).all()
-    )
-    total_page = math.ceil(total / g.count)
-
-    return LogPageSchema(
-        page=g.page,
-        count=g.count,
-        total=total,
-        items=get_items_with_time_field(items),
-        total_page=total_page,
-    )
+    return get_log_page("log")
 
 
 @log_api.route("/search")
@@ -63,30 +58,64 @@ def search_logs():
     """
     日志搜索（人员，时间, 关键字），分页展示
     """
-    if g.keyword:
-        logs = Log.query.filter(Log.message.like(f"%{g.keyword}%"))
-    else:
-        logs = Log.query.filter()
-    if g.name:
-        logs = logs.filter(Log.username == g.name)
+    filters = dict(keyword=g.keyword, name=g.name)
     if g.start and g.end:
-        logs = logs.filter(Log.create_time.between(g.start, g.end))
+        filters.update(start=g.start, end=g.end)
+    return get_log_page("log_search", filters)
 
-    total = logs.count()
-    items = (
-        logs.order_by(text("create_time desc")).offset(g.offset).limit(g.count).all()
-    )
-    total_page = math.ceil(total / g.count)
 
-    return LogPageSchema(
-        page=g.page,
-        count=g.count,
-        total=total,
-        items=get_items_with_time_field(items),
-        total_page=total_page,
+@log_api.route("/export")
+@permission_meta(name="导出日志", module="日志")
+@group_required
+@api.validate(
+    headers=AuthorizationSchema,
+    query=LogExportSchema,
+    tags=["日志"],
+)
+def export_logs():
+    """
+    流式导出日志（人员，时间, 关键字），格式为 csv 或 ndjson
+    请求头 Accept-Encoding 包含 gzip 时压缩输出；
+    传入已导出的最后一条日志的 after_time 与 after_id 可断点续传
+    """
+    logs = filter_logs()
+    after = None
+    if g.after_time and g.after_id is not None:
+        after = [g.after_time, g.after_id]
+    fmt = g.format.value
+    compress = "gzip" in request.accept_encodings
+    headers = {
+        "Content-Disposition": "attachment; filename=logs.{fmt}".format(fmt=fmt)
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return Response(
+        log_exporter.stream(log_exporter.statement(logs, after), fmt, compress),
+        mimetype=MIMETYPES[fmt],
+        headers=headers,
     )
 
 
+@log_api.route("/analytics")
+@permission_meta(name="日志统计", module="日志")
+@group_required
+@api.validate(
+    headers=AuthorizationSchema,
+    query=LogAnalyticsQuerySchema,
+    resp=DocResponse(r=LogAnalyticsSchema),
+    tags=["日志"],
+)
+def get_log_analytics():
+    """
+    按小时 / 天统计操作次数，可按人员、权限、路径、状态码细分
+    """
+    start = datetime.strptime(g.start, "%Y-%m-%d %H:%M:%S") if g.start else None
+    end = datetime.strptime(g.end, "%Y-%m-%d %H:%M:%S") if g.end else None
+    dimensions = g.group_by.split(",") if g.group_by else ()
+    items = log_rollup.query(g.granularity.value, start, end, dimensions)
+    return LogAnalyticsSchema(granularity=g.granularity, items=items)
+
+
 @log_api.route("/users")
 @permission_meta(name="查询日志记录的用户", module="日志")
 @group_required
@@ -99,14 +128,46 @@ def get_users_for_log():
     """
     获取所有记录行为日志的用户名
     """
-    usernames = (
-        db.session.query(Log.username)
-        .filter_by(soft=False)
-        .group_by(text("username"))
-        .having(text("count(username) > 0"))
-        .all()
+    return UsernameListSchema(items=log_usernames.all())
+
+
+def filter_logs():
+    """
+    按关键字、人员、时间段筛选日志，开启分区时合并与时间段有交集的分区
+    """
+    return log_partitions.query(g.start, g.end, keyword=g.keyword, name=g.name)
+
+
+def get_log_page(name, filters=None):
+    """
+    按 (create_time, id) 倒序分页，传入游标时走索引定位，深分页与首页成本一致；
+    合并分区时游标、排序与条数下推到每个分区的查询中
+    lin_log 的总数按列表名及筛选条件缓存，翻页时不再重复计数，
+    列表与搜索的总数使用不同的列表名缓存；分区的条数由 log_partitions 分别缓存，
+    分区的迁移与删除会使两者失效
+    """
+    filters = filters or dict()
+    logs = log_partitions.query(
+        cursor=g.cursor, count=g.count, offset=g.offset, **filters
+    )
+    total = total_page = None
+    if g.with_total:
+        total = count_cache.count(
+            log_partitions.hot(**filters), name, ("lin_log",), filters
+        ) + log_partitions.count(**filters)
+        total_page = math.ceil(total / g.count)
+    items, next_cursor, prev_cursor = keyset_paginate(
+        logs, [Log.create_time, Log.id], g.cursor, g.count, offset=g.offset
+    )
+    return LogPageSchema(
+        page=g.page,
+        count=g.count,
+        total=total,
+        items=get_items_with_time_field(items),
+        total_page=total_page,
+        next=next_cursor,
+        prev=prev_cursor,
     )
-    return UsernameListSchema(items=[u.username for u in usernames])
 
 
 # TODO：临时time字段, 等待lin 核心库中调整后移除
@@ -7,8 +7,6 @@
 from operator import and_
 
 from flask_jwt_extended import (
-    create_access_token,
-    create_refresh_token,
     get_current_user,
     get_jwt_identity,
     verify_jwt_refresh_token_in_request,
@@ -16,12 +14,16 @@ from flask_jwt_extended import (
 from lin import manager, permission_meta
 from lin.db import db
 from lin.exception import Duplicated, Failed, NotFound, ParameterError, Success
-from lin.jwt import admin_required, get_tokens, login_required
-from lin.logger import Log, Logger
+from lin.jwt import login_required
 from lin.redprint import Redprint
 
 from app.exception.api import RefreshFailed
-from app.util.common import split_group
+from app.extension.cache.conditional import conditional, current_user_version
+from app.extension.log.logger import Logger
+from app.extension.log.writer import log_writer
+from app.extension.permission.cache import permission_cache
+from app.extension.permission.groups import group_cache
+from app.extension.permission.jwt import admin_required, get_tokens, refresh_tokens
 from app.validator.form import (
     ChangePasswordForm,
     LoginForm,
@@ -53,7 +55,7 @@ def login():
     form = LoginForm().validate_for_api()
     user = manager.user_model.verify(form.username.data, form.password.data)
     # 用户未登录，此处不能用装饰器记录日志
-    Log.create_log(
+    log_writer.write(
         message=f"{user.username}登陆成功获取了令牌",
         user_id=user.id,
         username=user.username,
@@ -61,7 +63,6 @@ def login():
         method="post",
         path="/cms/user/login",
         permission="",
-        commit=True,
     )
     access_token, refresh_token = get_tokens(user)
     return {"access_token": access_token, "refresh_token": refresh_token}
@@ -109,6 +110,7 @@ def change_password():
 @user_api.route("/information")
 @permission_meta(name="查询自己信息", module="用户", mount=False)
 @login_required
+@conditional(current_user_version, private=True)
 def get_information():
     current_user = get_current_user()
     return current_user
@@ -124,8 +126,7 @@ def refresh():
 
     identity = get_jwt_identity()
     if identity:
-        access_token = create_access_token(identity=identity)
-        refresh_token = create_refresh_token(identity=identity)
+        access_token, refresh_token = refresh_tokens(identity)
         return {"access_token": access_token, "refresh_token": refresh_token}
 
     return NotFound("refresh_token未被识别")
@@ -136,14 +137,7 @@ def refresh():
 @login_required
 def get_allowed_apis():
     user = get_current_user()
-    groups = manager.group_model.select_by_user_id(user.id)
-    group_ids = [group.id for group in groups]
-    _permissions = manager.permission_model.select_by_group_ids(group_ids)
-    permission_list = [
-        {"permission": permission.name, "module": permission.module}
-        for permission in _permissions
-    ]
-    res = split_group(permission_list, "module")
+    res = permission_cache.get_permissions(user.id)
     setattr(user, "permissions", res)
     setattr(user, "admin", user.is_admin)
     user._fields.extend(["admin", "permissions"])
@@ -161,9 +155,9 @@ def _register_user(form: RegisterForm):
         db.session.flush()
         user.password = form.password.data
         group_ids = form.group_ids.data
-        # 如果没传分组数据，则将其设定为 id 2 的 guest 分组
+        # 如果没传分组数据，则将其设定为 guest 分组
         if len(group_ids) == 0:
-            group_ids = [2]
+            group_ids = [group_cache.guest_id]
         for group_id in group_ids:
             user_group = manager.user_group_model()
             user_group.user_id = user.id
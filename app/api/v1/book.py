@@ -2,6 +2,11 @@ from lin.redprint import Redprint
 from lin.exception import NotFound, Success
 from lin.apidoc import api
 from app.model.v1.book import Book
+from app.extension.cache.conditional import conditional, row_version, table_version
+from app.extension.cache.response import response_cache
+from app.extension.count.cache import count_cache
+from app.util.fields import get_fields_from_query, load_fields, select_fields
+from app.util.page import keyset_page
 from app.validator.book import BookQuerySearchSchema, BookSchema
 from flask import g, request
 
@@ -10,11 +15,15 @@ book_api = Redprint('e')
 
 
 @book_api.route('/<int:id>')
+@conditional(row_version(Book))
+@response_cache.cached([Book.__table__.name])
 def get_book(id):
     # 通过Book模型在数据库中查询id=`id`, 且没有被软删除的书籍
-    book = Book.query.filter_by(id=id, delete_time=None).first()
+    # ?fields= / ?exclude= 指定的字段之外的列不会被查询
+    fields = get_fields_from_query(Book)
+    book = load_fields(Book.query, Book, fields).filter_by(id=id, delete_time=None).first()
     if book:
-        return book # 如果存在，返回该数据的信息
+        return select_fields(book, fields) # 如果存在，返回该数据的信息
     raise NotFound('没有找到相关书籍') # 如果书籍不存在，返回一个异常给前端
  
 
@@ -24,12 +33,14 @@ def get_book(id):
 # 使用校验，需要引入定义好的对象`api`,它是Spectree的一个实例
 # query代表来自url中的参数，如`http://127.0.0.1:5000?q=abc&page=1`中的 `q` 和 `page`都属于query参数
 @api.validate(query=BookQuerySearchSchema)
+@response_cache.cached([Book.__table__.name])
 def search_book():
     # 使用这种方式校验通过的参数将会被挂载到g的对应属性上，方便直接取用。
     q = '%' + g.q + '%' # 取出参数中的`q`参数，加`%`进行模糊查询
-    books = Book.query.filter(Book.title.like(q), Book.delete_time==None).all() # 搜索书籍标题
+    fields = get_fields_from_query(Book)
+    books = load_fields(Book.query, Book, fields).filter(Book.title.like(q), Book.delete_time==None).all() # 搜索书籍标题
     if books:
-        return books
+        return select_fields(books, fields)
     raise NotFound('没有找到相关书籍')
 
 @book_api.route("", methods=["POST"])
@@ -69,8 +80,15 @@ def delete_book(id: int):
     raise NotFound(10020)
 
 @book_api.route("")
+@conditional(table_version(Book))
+@response_cache.cached([Book.__table__.name])
 def get_books():
     """
-    获取图书列表
+    分页获取图书列表，按 id 正序；传入 cursor 时按游标翻页
     """
-    return Book.get(one=False)
\ No newline at end of file
+    fields = get_fields_from_query(Book)
+    books = Book.query.filter_by(delete_time=None)
+    total = count_cache.count(books, "books", (Book.__table__.name,))
+    page = keyset_page(load_fields(books, Book, fields), [Book.id], total)
+    select_fields(page["items"], fields)
+    return page
\ No newline at end of file
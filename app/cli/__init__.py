@@ -2,7 +2,11 @@ import click
 from flask.cli import AppGroup
 
 from .db import fake as _db_fake
+from .db import index as _db_index
 from .db import init as _db_init
+from .db import rollup as _db_rollup
+from .db import import_users as _db_import_users
+from .db import rotate as _db_rotate
 from .plugin import generate as _plugin_generate
 from .plugin import init as _plugin_init
 
@@ -31,6 +35,60 @@ def db_fake():
     click.echo("fake数据添加成功")
 
 
+@db_cli.command("index")
+def db_index():
+    """
+    create missing indexes on existing tables.
+    """
+    created = _db_index()
+    for name in created:
+        click.echo("创建索引 {name}".format(name=name))
+    click.echo("索引同步完成")
+
+
+@db_cli.command("rollup")
+@click.option("--start", type=click.DateTime(), help="Start date, defaults to all.")
+@click.option("--end", type=click.DateTime(), help="End date, defaults to all.")
+def db_rollup(start, end):
+    """
+    rebuild log rollup tables from lin_log.
+    """
+    total = _db_rollup(start, end)
+    click.echo("日志汇总回填完成，共 {total} 条".format(total=total))
+
+
+@db_cli.command("rotate")
+@click.option("--no-purge", is_flag=True, help="Keep partitions past retention.")
+def db_rotate(no_purge):
+    """
+    move closed months of lin_log into monthly partitions.
+    """
+    rotated, archived = _db_rotate(not no_purge)
+    for name in rotated:
+        click.echo("迁移分区 {name}".format(name=name))
+    for path in archived:
+        click.echo("归档分区 {path}".format(path=path))
+    click.echo("日志分区整理完成")
+
+
+@db_cli.command("import-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="File format.")
+def db_import_users(path, fmt):
+    """
+    bulk create users from a csv / jsonl file.
+    """
+    report = _db_import_users(path, fmt)
+    for item in report["items"]:
+        if not item["success"]:
+            click.echo(
+                "第 {line} 行 {username}: {message}".format(**item), err=True
+            )
+    click.echo(
+        "导入完成，共 {total} 条，成功 {created} 条，失败 {failed} 条".format(**report)
+    )
+
+
 @plugin_cli.command("init", with_appcontext=False)
 def plugin_init():
     """
@@ -1,2 +1,6 @@
 from .fake import fake
+from .index import index
 from .init import init
+from .rollup import rollup
+from .rotate import rotate
+from .users import import_users
@@ -0,0 +1,57 @@
+"""
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from lin.db import db
+from sqlalchemy import func, inspect, select
+
+from app.extension.log.rollup import log_rollup
+from app.extension.log.search import log_search
+from app.extension.log.usernames import log_usernames
+from app.extension.permission.version import acl_version
+
+
+def index():
+    """
+    为已存在的表补建模型中新增的索引，返回新建的索引名
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = list()
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {i["name"] for i in inspector.get_indexes(table.name)}
+        for idx in table.indexes:
+            if idx.name not in existing:
+                if idx.unique:
+                    dedupe(table, idx.columns)
+                idx.create(bind=db.engine)
+                created.append(idx.name)
+    # 权限版本表
+    created.extend(acl_version.create_table())
+    # 日志用户名表、汇总表
+    created.extend(log_usernames.create_table())
+    created.extend(log_rollup.create_tables())
+    # 日志全文索引
+    created.extend(log_search.create_index())
+    return created
+
+
+def dedupe(table, columns):
+    """
+    补建唯一索引前删除重复的行，每组重复中保留 id 最小的一行，返回删除的行数
+    """
+    if "id" not in table.c:
+        return 0
+    # 包一层派生表，MySQL 不允许 DELETE 的子查询直接读取同一张表
+    keep = (
+        select([func.min(table.c.id).label("id")])
+        .group_by(*columns)
+        .alias("keep")
+    )
+    with db.engine.begin() as conn:
+        result = conn.execute(
+            table.delete().where(table.c.id.notin_(select([keep.c.id])))
+        )
+    return result.rowcount
@@ -6,6 +6,8 @@ from lin import manager
 from lin.db import db
 from lin.enums import GroupLevelEnum
 
+from app.extension.log.search import log_search
+
 
 def init(force=False):
     db.create_all()
@@ -13,9 +15,9 @@ def init(force=False):
         db.drop_all()
         db.create_all()
     elif (
-        manager.user_model.get(one=False)
-        or manager.user_group_model.get(one=False)
-        or manager.group_model.get(one=False)
+        manager.user_model.exists_any()
+        or manager.user_group_model.exists_any()
+        or manager.group_model.exists_any()
     ):
         exit("表中存在数据，初始化失败")
     with db.auto_commit():
@@ -44,3 +46,5 @@ def init(force=False):
         db.session.add(guest_group)
         # 初始化权限
         manager.sync_permissions()
+    # 日志全文索引
+    log_search.create_index()
@@ -0,0 +1,13 @@
+"""
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from app.extension.log.rollup import log_rollup
+
+
+def rollup(start=None, end=None):
+    """
+    按行为日志回填小时 / 天汇总表，返回处理的日志条数
+    """
+    log_rollup.create_tables()
+    return log_rollup.backfill(start, end)
@@ -0,0 +1,17 @@
+"""
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from app.extension.log.partition import log_partitions
+
+
+def rotate(purge=True):
+    """
+    将过期月份的日志迁移到分区表，并导出删除超过保留期的分区
+    :return: 迁移的分区表名，导出的归档文件
+    """
+    if not log_partitions.config["ENABLE"]:
+        exit("LOG_PARTITION.ENABLE 未开启，日志查询不会读取分区表，已取消迁移")
+    rotated = log_partitions.rotate()
+    archived = log_partitions.purge() if purge else []
+    return rotated, archived
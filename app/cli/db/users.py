@@ -0,0 +1,19 @@
+"""
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import os
+
+from app.extension.user.importer import FORMAT_CSV, FORMAT_JSONL, user_importer
+
+
+def import_users(path, fmt=None):
+    """
+    从 csv / jsonl 文件批量导入用户，返回导入结果
+    """
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = FORMAT_JSONL if ext in (".jsonl", ".ndjson") else FORMAT_CSV
+    with open(path, encoding="utf-8") as f:
+        rows = user_importer.parse(f.read(), fmt)
+    return user_importer.run(rows)
@@ -31,6 +31,26 @@ class BaseConfig(object):
 
     # 令牌配置
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # access token 中携带分组及共享的权限版本号，版本号未变时鉴权无需查询用户
+    JWT_PERMISSION_CLAIMS = False
+
+    # 密码哈希配置
+    # SCHEME: 哈希方案 pbkdf2 / scrypt，PARAMS: 方案的成本参数
+    # EXECUTOR: thread / process / None(同步计算)，gevent worker 下使用 hub 的原生线程池
+    # 成本参数调整后，用户下次登录成功时会自动按新参数重新哈希
+    PASSWORD_HASH = {
+        "SCHEME": "pbkdf2",
+        "PARAMS": {"ITERATIONS": 150000},
+        "EXECUTOR": "thread",
+        "WORKERS": 4,
+    }
+
+    # 批量导入用户配置
+    # CHUNK_SIZE: 每个事务写入的用户数，MAX_ROWS: 单次最多导入的用户数
+    USER_IMPORT = {
+        "CHUNK_SIZE": 500,
+        "MAX_ROWS": 10000,
+    }
 
     # 默认文件上传配置
     FILE = {
@@ -51,9 +71,108 @@ class BaseConfig(object):
         "FILE": True,
     }
 
+    # 行为日志异步批量写入配置
+    # QUEUE_SIZE: 进程内队列容量，BATCH_SIZE/INTERVAL(ms): 满足其一即写入一批
+    # POLICY: 队列满时 block(等待 TIMEOUT 秒后同步写入) / drop(丢弃) / sync(同步写入)
+    LOG_WRITER = {
+        "ENABLE": True,
+        "QUEUE_SIZE": 10000,
+        "BATCH_SIZE": 100,
+        "INTERVAL": 500,
+        "POLICY": "block",
+        "TIMEOUT": 1,
+    }
+
+    # 日志全文检索配置
+    # 关键字短于 MIN_LENGTH 时回退到 LIKE（SQLite trigram 至少需要 3 个字符）
+    LOG_SEARCH = {
+        "ENABLE": True,
+        "MIN_LENGTH": 3,
+    }
+
+    # 日志导出配置
+    # BATCH_SIZE: 每次从服务端游标读取的行数，COMPRESS_LEVEL: gzip 压缩级别
+    LOG_EXPORT = {
+        "BATCH_SIZE": 1000,
+        "COMPRESS_LEVEL": 6,
+    }
+
+    # 日志汇总配置
+    # ENABLE: 日志写入时是否累加到小时 / 天汇总表，BATCH_SIZE: 回填时每批读取的日志条数
+    LOG_ROLLUP = {
+        "ENABLE": True,
+        "BATCH_SIZE": 5000,
+    }
+
+    # 日志按月分区配置
+    # HOT_MONTHS: lin_log 中除当月外保留的月数，
+    # 更早的月份由 flask db rotate 按批迁移到 lin_log_YYYYMM
+    # RETENTION: 分区表保留的月数，过期后压缩导出到 ARCHIVE_DIR 并删除整表
+    # 开启后日志查询会合并与 start / end 有交集的分区表，TTL 为分区列表的缓存秒数
+    # BATCH_SIZE: 迁移时每个事务移动的日志条数
+    LOG_PARTITION = {
+        "ENABLE": False,
+        "HOT_MONTHS": 1,
+        "RETENTION": 12,
+        "ARCHIVE_DIR": "logs/archive",
+        "TTL": 60,
+        "BATCH_SIZE": 5000,
+    }
+
     # 分页配置
     COUNT_DEFAULT = 10
     PAGE_DEFAULT = 0
 
+    # 分页总数缓存配置
+    # TTL: 缓存有效秒数，其他 worker 写入数据时总数最多滞后 TTL 秒
+    # ESTIMATE: 无筛选条件的总数是否使用表统计信息估算，
+    # 估算值不低于 ESTIMATE_THRESHOLD 时才采用，否则仍精确计数
+    COUNT_CACHE = {
+        "SIZE": 1024,
+        "TTL": 10,
+        "ESTIMATE": False,
+        "ESTIMATE_THRESHOLD": 100000,
+    }
+
+    # 公开读接口的响应缓存配置
+    # ENABLE: 是否启用，SIZE: 最多缓存的响应数，MAX_BYTES: 缓存响应体的总字节数上限
+    # TTL: 默认有效秒数（路由可单独指定），其他 worker 写入数据时最多滞后 TTL 秒
+    RESPONSE_CACHE = {
+        "ENABLE": True,
+        "SIZE": 512,
+        "MAX_BYTES": 32 * 1024 * 1024,
+        "TTL": 30,
+    }
+
     # 兼容中文
     JSON_AS_ASCII = False
+
+    # 响应压缩配置，按 Accept-Encoding 协商 br（需 pip install brotli）/ gzip
+    # MIN_SIZE: 小于该字节数的响应不压缩，GZIP_LEVEL / BROTLI_QUALITY: 压缩级别
+    # CACHE_SIZE / CACHE_BYTES: 按 ETag 缓存的压缩结果的条目数与总字节数上限
+    COMPRESS = {
+        "ENABLE": True,
+        "MIN_SIZE": 1024,
+        "GZIP_LEVEL": 6,
+        "BROTLI_QUALITY": 5,
+        "CACHE_SIZE": 256,
+        "CACHE_BYTES": 16 * 1024 * 1024,
+    }
+
+    # JSON 序列化配置
+    # MODE: lin 使用 Lin 的 JSONEncoder；
+    # compiled 为每个模型类编译序列化函数，直接输出字节，需配合 orjson 才有收益
+    # BACKEND: compiled 模式的编码后端 auto / orjson / simplejson，
+    # auto 时优先使用 orjson（需 pip install orjson）
+    JSON_ENCODER = {
+        "MODE": "lin",
+        "BACKEND": "auto",
+    }
+
+    # 用户权限缓存配置
+    # SIZE: 最多缓存的用户数，超出后按 LRU 淘汰
+    # TTL: 缓存有效秒数，多 worker 部署时用于限制其他进程的缓存滞后时间
+    PERMISSION_CACHE = {
+        "SIZE": 1024,
+        "TTL": 60,
+    }
@@ -0,0 +1,134 @@
+"""
+    conditional request of Lin
+    ~~~~~~~~~
+
+    条件请求：视图按数据版本（max(update_time)、max(id) 等索引查询）生成
+    弱 ETag 与 Last-Modified，If-None-Match / If-Modified-Since 命中时
+    直接返回 304，不执行视图函数；未指定数据版本时按响应体摘要生成 ETag
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import hashlib
+from collections import Counter
+from functools import wraps
+
+from flask import current_app, request
+from flask_jwt_extended import get_current_user
+from lin.db import db
+from sqlalchemy import func
+from werkzeug.http import is_resource_modified
+
+from .hooks import on_tables_changed
+
+# 精确到微秒，数据库支持时同一秒内的多次修改也会生成不同的 ETag
+STAMP_FORMAT = "%Y%m%d%H%M%S%f"
+
+# 表名 -> 本进程内经 session 提交的变动次数
+_table_versions = Counter()
+
+
+@on_tables_changed()
+def _bump_table_versions(tables):
+    _table_versions.update(tables)
+
+
+def _etag(name, ident, last_modified):
+    return "{name}-{ident}-{stamp}".format(
+        name=name, ident=ident, stamp=last_modified.strftime(STAMP_FORMAT)
+    )
+
+
+def table_version(model):
+    """
+    整表的数据版本：max(update_time)、max(id) 与该表的变动次数
+    软删除同样会更新 update_time，max(id) 用于区分同一时刻的新增；
+    物理删除不是最大 id 的行时两者都不变，由提交后递增的变动次数区分，
+    不需要每次请求都统计总行数。变动次数按进程记录，其他进程的物理删除不会计入
+    """
+    table = model.__tablename__
+
+    def version(*args, **kwargs):
+        last_modified, last_id = db.session.query(
+            func.max(model.update_time), func.max(model.id)
+        ).one()
+        if last_modified is None:
+            return None, None
+        ident = "{id}-{version}".format(id=last_id, version=_table_versions[table])
+        etag = _etag(table + "-list", ident, last_modified)
+        return etag, last_modified
+
+    return version
+
+
+def row_version(model, key="id"):
+    """
+    单行的数据版本：按路由参数 key 查询该行的 update_time
+    """
+
+    def version(*args, **kwargs):
+        ident = kwargs[key]
+        last_modified = (
+            db.session.query(model.update_time)
+            .filter(model.id == ident, model.delete_time == None)
+            .scalar()
+        )
+        if last_modified is None:
+            return None, None
+        return _etag(model.__tablename__, ident, last_modified), last_modified
+
+    return version
+
+
+def current_user_version(*args, **kwargs):
+    """
+    当前登录用户的数据版本：用户已在鉴权时加载，按其字段计算摘要，
+    不受 update_time 秒级精度的影响
+    """
+    user = get_current_user()
+    if user is None:
+        return None, None
+    fields = repr([(key, user[key]) for key in sorted(user.keys())])
+    digest = hashlib.sha1(fields.encode("utf-8")).hexdigest()
+    return "user-{id}-{digest}".format(id=user.id, digest=digest), user.update_time
+
+
+def conditional(version=None, private=False):
+    """
+    条件请求装饰器，放在 route 及鉴权装饰器之下
+    version: 与视图函数参数相同的函数，返回 (etag, last_modified)，不传时按响应体摘要生成 ETag
+    private: 响应因用户而异时为 True，共享缓存不得缓存
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return func(*args, **kwargs)
+            etag, last_modified = (
+                version(*args, **kwargs) if version is not None else (None, None)
+            )
+            if (etag or last_modified) and not is_resource_modified(
+                request.environ, etag=etag, last_modified=last_modified
+            ):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            if etag:
+                response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            # 客户端每次使用缓存前都需携带验证信息重新验证
+            response.cache_control.no_cache = True
+            if private:
+                response.cache_control.private = True
+            if response.status_code == 200 and not (etag or last_modified):
+                response.add_etag()
+                response.make_conditional(request)
+            return response
+
+        return wrapper
+
+    return decorator
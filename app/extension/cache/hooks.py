@@ -0,0 +1,69 @@
+"""
+    table change hooks of Lin
+    ~~~~~~~~~
+
+    会话提交后按变动的表回调：记录 flush 及批量 update / delete 涉及的表名，
+    提交后通知关注这些表的回调，回滚时丢弃；
+    不经过 session 的写入（如 engine 直接执行的语句）需由调用方自行失效缓存
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# session.info 中记录本次事务变动的表名
+CHANGED_KEY = "changed_tables"
+
+# (关注的表名，为空时关注所有表, 回调)
+_handlers = list()
+
+
+def on_tables_changed(*tables):
+    """
+    注册提交后的回调，参数为本次提交中变动且被关注的表名集合
+    :param tables: 关注的表名，不传时关注所有表
+    """
+    watched = frozenset(tables)
+
+    def decorator(fn):
+        _handlers.append((watched, fn))
+        return fn
+
+    return decorator
+
+
+def _mark(session, table):
+    session.info.setdefault(CHANGED_KEY, set()).add(table)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table is not None:
+            _mark(session, table)
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _after_bulk(context):
+    mapper = getattr(context, "mapper", None)
+    if mapper is not None:
+        _mark(context.session, mapper.local_table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    tables = session.info.pop(CHANGED_KEY, None)
+    if not tables:
+        return
+    for watched, fn in _handlers:
+        changed = tables.intersection(watched) if watched else tables
+        if changed:
+            fn(changed)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop(CHANGED_KEY, None)
@@ -0,0 +1,111 @@
+"""
+    lru cache of Lin
+    ~~~~~~~~~
+
+    进程内的 LRU 缓存：条目可带过期时间，按条目数及可选的总字节数淘汰；
+    传入 config_key 时容量（SIZE）、有效期（TTL）、总字节数（MAX_BYTES）
+    从 app.config 中对应的配置读取，未配置时使用构造参数
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import time
+from collections import OrderedDict, namedtuple
+from threading import RLock
+
+from flask import current_app, has_app_context
+
+# 缓存条目：过期时间（None 为不过期）、字节数、值
+Item = namedtuple("item", ["expire_at", "nbytes", "value"])
+
+
+class LRUCache(object):
+    def __init__(self, config_key=None, size=1024, ttl=None, max_bytes=None):
+        self._items = OrderedDict()
+        self._bytes = 0
+        # 调用方需要“校验后写入”等复合操作时可持有该锁
+        self.lock = RLock()
+        self.config_key = config_key
+        self.size = size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @property
+    def config(self) -> dict:
+        if self.config_key is None or not has_app_context():
+            return dict()
+        return current_app.config.get(self.config_key, dict())
+
+    @property
+    def capacity(self):
+        return self.config.get("SIZE", self.size)
+
+    @property
+    def default_ttl(self):
+        return self.config.get("TTL", self.ttl)
+
+    @property
+    def byte_limit(self):
+        return self.config.get("MAX_BYTES", self.max_bytes)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def get(self, key, valid=None):
+        """
+        获取未过期的值，valid(value) 为 False 时视为失效并移除
+        """
+        with self.lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if (item.expire_at is not None and item.expire_at < time.monotonic()) or (
+                valid is not None and not valid(item.value)
+            ):
+                self._remove(key)
+                return None
+            self._items.move_to_end(key)
+            return item.value
+
+    def set(self, key, value, ttl=None, nbytes=0) -> bool:
+        """
+        写入值，ttl 不传时使用默认有效期；单个值超过总字节数上限时不写入
+        """
+        byte_limit = self.byte_limit
+        if byte_limit is not None and nbytes > byte_limit:
+            return False
+        ttl = self.default_ttl if ttl is None else ttl
+        expire_at = None if ttl is None else time.monotonic() + ttl
+        with self.lock:
+            self._remove(key)
+            self._items[key] = Item(expire_at, nbytes, value)
+            self._bytes += nbytes
+            capacity = self.capacity
+            while len(self._items) > capacity or (
+                byte_limit is not None and self._bytes > byte_limit
+            ):
+                self._remove(next(iter(self._items)))
+        return True
+
+    def pop(self, key):
+        with self.lock:
+            item = self._remove(key)
+        return None if item is None else item.value
+
+    def clear(self):
+        with self.lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._bytes -= item.nbytes
+        return item
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,138 @@
+"""
+    response cache of Lin
+    ~~~~~~~~~
+
+    公开读接口的响应缓存：按 (路由, 路径, 规整后的查询参数) 缓存序列化后的响应体，
+    每个路由可单独指定 TTL，按条目数与总字节数 LRU 淘汰；
+    路由涉及的表经 InfoCrud 的 create / update / delete 提交后立即失效，
+    其他 worker 的缓存最多滞后 TTL 秒
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from collections import Counter, namedtuple
+from functools import wraps
+
+from flask import current_app, request
+
+from .hooks import on_tables_changed
+from .lru import LRUCache
+
+# 缓存条目：涉及的表、写入时各表的版本号、响应体、Content-Type
+Entry = namedtuple("entry", ["tables", "versions", "body", "content_type"])
+
+HIT = "HIT"
+MISS = "MISS"
+
+
+class ResponseCache(object):
+    def __init__(self, size=512, max_bytes=32 * 1024 * 1024, ttl=30):
+        self._entries = LRUCache(
+            "RESPONSE_CACHE", size=size, ttl=ttl, max_bytes=max_bytes
+        )
+        self._lock = self._entries.lock
+        # 表名 -> 版本号，表数据变动时递增
+        self._versions = dict()
+        # (路由, HIT / MISS) -> 次数
+        self._counters = Counter()
+
+    def cached(self, tables, ttl=None):
+        """
+        缓存路由的响应，放在 route 装饰器之下
+        :param tables: 响应涉及的表名，任一表变动即失效
+        :param ttl: 该路由的缓存有效秒数，不传时使用 RESPONSE_CACHE.TTL
+        """
+        tables = tuple(tables)
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if (
+                    not self._entries.config.get("ENABLE", True)
+                    or request.method != "GET"
+                ):
+                    return func(*args, **kwargs)
+                key = self._key()
+                versions = self._versions_of(tables)
+                entry = self._entries.get(key, lambda e: e.versions == versions)
+                if entry is not None:
+                    self._count(request.endpoint, HIT)
+                    return self._response(entry, HIT)
+                self._count(request.endpoint, MISS)
+                response = current_app.make_response(func(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    body = response.get_data()
+                    self._store(
+                        key, Entry(tables, versions, body, response.content_type), ttl
+                    )
+                response.headers["X-Cache"] = MISS
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, *tables):
+        """
+        表数据变动时调用，使涉及这些表的缓存失效
+        """
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        缓存统计：条目数、字节数及各路由的命中、未命中次数
+        """
+        with self._lock:
+            endpoints = dict()
+            for (endpoint, result), n in self._counters.items():
+                endpoints.setdefault(endpoint, {HIT: 0, MISS: 0})[result] = n
+            return dict(
+                entries=len(self._entries),
+                bytes=self._entries.bytes,
+                hits=sum(e[HIT] for e in endpoints.values()),
+                misses=sum(e[MISS] for e in endpoints.values()),
+                endpoints=endpoints,
+            )
+
+    @staticmethod
+    def _key():
+        # 查询参数按名称、值排序，参数顺序不同的请求共用缓存
+        args = tuple(sorted(request.args.items(multi=True)))
+        return request.endpoint, request.path, args
+
+    def _versions_of(self, tables):
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def _store(self, key, entry, ttl):
+        with self._lock:
+            # 渲染期间表数据发生了变动，则不写入缓存
+            if entry.versions == self._versions_of(entry.tables):
+                self._entries.set(key, entry, ttl, len(entry.body))
+
+    def _count(self, endpoint, result):
+        with self._lock:
+            self._counters[(endpoint, result)] += 1
+
+    @staticmethod
+    def _response(entry, result):
+        response = current_app.response_class(
+            entry.body, content_type=entry.content_type
+        )
+        response.headers["X-Cache"] = result
+        return response
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
+
+
+@on_tables_changed()
+def _invalidate(tables):
+    response_cache.invalidate(*tables)
@@ -0,0 +1,170 @@
+"""
+    response compressor of Lin
+    ~~~~~~~~~
+
+    响应压缩：按 Accept-Encoding 协商 br / gzip（br 需安装 brotli），
+    小于 MIN_SIZE 的响应不压缩；流式响应逐块压缩输出，
+    带 ETag 的响应按 (路径及查询参数, ETag, 编码) 缓存压缩结果，热点数据只压缩一次
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import zlib
+from collections import namedtuple
+
+from flask import request
+
+from app.extension.cache.lru import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODING_BR = "br"
+ENCODING_GZIP = "gzip"
+
+# 可压缩的 Content-Type 前缀，SSE 需逐条实时送达，不压缩
+COMPRESSIBLE = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+EXCLUDED = ("text/event-stream",)
+
+# 压缩缓存条目：原响应体的校验和、长度，压缩后的响应体
+Entry = namedtuple("entry", ["checksum", "length", "body"])
+
+
+class _BrotliStream(object):
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class Compressor(object):
+    def __init__(self):
+        self.app = None
+        self.config = dict(
+            ENABLE=True,
+            MIN_SIZE=1024,
+            GZIP_LEVEL=6,
+            BROTLI_QUALITY=5,
+            CACHE_SIZE=256,
+            CACHE_BYTES=16 * 1024 * 1024,
+        )
+        self._entries = LRUCache()
+
+    def init_app(self, app):
+        self.app = app
+        self.config.update(app.config.get("COMPRESS", dict()))
+        self._entries.size = self.config["CACHE_SIZE"]
+        self._entries.max_bytes = self.config["CACHE_BYTES"]
+        if self.config["ENABLE"]:
+            app.after_request(self.after_request)
+
+    @property
+    def encodings(self) -> list:
+        """
+        支持的编码，按优先级排列
+        """
+        return [ENCODING_BR, ENCODING_GZIP] if brotli is not None else [ENCODING_GZIP]
+
+    def negotiate(self, accept_encodings):
+        return accept_encodings.best_match(self.encodings)
+
+    def after_request(self, response):
+        if not self._compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+        if response.is_streamed or response.direct_passthrough:
+            response.direct_passthrough = False
+            response.response = self._stream(response.iter_encoded(), encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.config["MIN_SIZE"]:
+                return response
+            response.set_data(self._compress_cached(response, body, encoding))
+        response.headers["Content-Encoding"] = encoding
+        # 压缩后的表示与原响应体不再逐字节相同，强 ETag 改为弱 ETag
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def compress(self, body, encoding) -> bytes:
+        stream = self._compressobj(encoding)
+        return stream.compress(body) + stream.flush()
+
+    def clear(self):
+        self._entries.clear()
+
+    def _compressible(self, response):
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+        ):
+            return False
+        mimetype = response.mimetype or ""
+        return mimetype.startswith(COMPRESSIBLE) and not mimetype.startswith(EXCLUDED)
+
+    def _compressobj(self, encoding):
+        if encoding == ENCODING_BR:
+            return _BrotliStream(self.config["BROTLI_QUALITY"])
+        return zlib.compressobj(
+            self.config["GZIP_LEVEL"], zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def _stream(self, chunks, encoding):
+        stream = self._compressobj(encoding)
+        try:
+            for chunk in chunks:
+                data = stream.compress(chunk)
+                if data:
+                    yield data
+            yield stream.flush()
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def _compress_cached(self, response, body, encoding):
+        """
+        带 ETag 的响应按 (路径及查询参数, ETag, 编码) 缓存压缩结果，
+        命中前校验原响应体的长度与校验和；
+        整表版本的 ETag 不区分查询参数，同一 ETag 的不同分页需分别缓存
+        """
+        etag, _ = response.get_etag()
+        if not etag:
+            return self.compress(body, encoding)
+        key = (request.full_path, etag, encoding)
+        checksum = zlib.crc32(body)
+        entry = self._entries.get(
+            key, lambda e: e.checksum == checksum and e.length == len(body)
+        )
+        if entry is not None:
+            return entry.body
+        compressed = self.compress(body, encoding)
+        self._entries.set(
+            key, Entry(checksum, len(body), compressed), nbytes=len(compressed)
+        )
+        return compressed
+
+    def __len__(self):
+        return len(self._entries)
+
+
+compressor = Compressor()
@@ -0,0 +1,110 @@
+"""
+    count cache of Lin
+    ~~~~~~~~~
+
+    分页列表总数缓存：按 (列表名, 规整后的筛选条件) 缓存 COUNT 结果，
+    短 TTL 过期，涉及的表有新增、修改、删除时立即失效；
+    开启估算模式后，无筛选条件的总数直接读取数据库的表统计信息
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from collections import namedtuple
+
+from lin.db import db
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError
+
+from app.extension.cache.hooks import on_tables_changed
+from app.extension.cache.lru import LRUCache
+
+# 缓存条目：写入时各表的版本号、总数
+Entry = namedtuple("entry", ["versions", "total"])
+
+
+class CountCache(object):
+    def __init__(self, size=1024, ttl=10):
+        self._entries = LRUCache("COUNT_CACHE", size=size, ttl=ttl)
+        # 表名 -> 版本号，表数据变动时递增
+        self._versions = dict()
+
+    def count(self, query, name, tables, filters=None, estimate=True):
+        """
+        获取查询的总数
+        :param query: 计数的查询，或返回总数的函数
+        :param name: 列表名，与筛选条件共同组成缓存键
+        :param tables: 查询涉及的表名，任一表变动即失效
+        :param filters: 筛选条件，值为空的条件会被忽略
+        :param estimate: 无筛选条件时是否允许使用表统计信息估算
+        """
+        key = (name, self._normalize(filters))
+        versions = self._versions_of(tables)
+        entry = self._entries.get(key, lambda e: e.versions == versions)
+        if entry is not None:
+            return entry.total
+        total = None
+        if estimate and not key[1] and len(tables) == 1:
+            total = self.estimate(tables[0])
+        if total is None:
+            total = query() if callable(query) else query.count()
+        self._entries.set(key, Entry(versions, total))
+        return total
+
+    def estimate(self, table):
+        """
+        从表统计信息读取行数，估算值低于阈值或数据库不支持时返回 None，由调用方精确计数
+        """
+        if not self._entries.config.get("ESTIMATE", False):
+            return None
+        sql = ESTIMATE_SQL.get(db.engine.dialect.name)
+        if sql is None:
+            return None
+        try:
+            # 使用独立连接，统计表不存在时不影响当前会话的事务
+            with db.engine.connect() as conn:
+                rows = conn.execute(text(sql), table=table).scalar()
+        except DatabaseError:
+            return None
+        threshold = self._entries.config.get("ESTIMATE_THRESHOLD", 100000)
+        if rows is None or rows < threshold:
+            return None
+        return int(rows)
+
+    def invalidate(self, *tables):
+        """
+        表数据变动时调用，使涉及这些表的缓存失效
+        """
+        with self._entries.lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def _versions_of(self, tables):
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    @staticmethod
+    def _normalize(filters):
+        if not filters:
+            return tuple()
+        return tuple(
+            sorted((k, str(v)) for k, v in filters.items() if v not in (None, ""))
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 各数据库读取表行数统计信息的语句
+ESTIMATE_SQL = {
+    "mysql": "SELECT TABLE_ROWS FROM information_schema.TABLES "
+    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table",
+    "postgresql": "SELECT reltuples::bigint FROM pg_class WHERE relname = :table",
+    # stat 的第一项为表的行数，需先执行 ANALYZE 生成 sqlite_stat1
+    "sqlite": "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = :table LIMIT 1",
+}
+
+count_cache = CountCache()
+
+
+@on_tables_changed()
+def _invalidate(tables):
+    count_cache.invalidate(*tables)
@@ -0,0 +1,34 @@
+"""
+    logger of Lin
+    ~~~~~~~~~
+
+    用户行为日志记录器，日志交由 log_writer 异步批量写入
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from flask import request
+from lin import find_info_by_ep
+from lin.logger import Logger as LinLogger
+
+from .writer import log_writer
+
+
+class Logger(LinLogger):
+    def write_log(self):
+        info = find_info_by_ep(request.endpoint)
+        permission = info.name if info is not None else ""
+        status_code = getattr(self.response, "status_code", None)
+        if status_code is None:
+            status_code = getattr(self.response, "code", None)
+        if status_code is None:
+            status_code = 0
+        log_writer.write(
+            message=self.message,
+            user_id=self.user.id,
+            username=self.user.username,
+            status_code=status_code,
+            method=request.method,
+            path=request.path,
+            permission=permission,
+        )
@@ -0,0 +1,340 @@
+"""
+    log partition of Lin
+    ~~~~~~~~~
+
+    行为日志按月分区：lin_log 只保留最近几个月的热数据，
+    已结束的月份按批迁移到 lin_log_YYYYMM 分区表；
+    查询时只合并与 start / end 有交集的分区，筛选条件下推到每个分区的查询中，
+    超过保留期的分区整表压缩导出为 ndjson.gz 后删除，不再逐行 DELETE
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import os
+import re
+import time
+from datetime import datetime
+from threading import Lock
+
+from lin.db import db
+from lin.logger import Log
+from sqlalchemy import (
+    Index,
+    MetaData,
+    Table,
+    and_,
+    false,
+    func,
+    inspect,
+    select,
+    union_all,
+)
+
+from app.extension.cache.lru import LRUCache
+from app.extension.count.cache import count_cache
+from app.util.page import keyset_window
+
+from .export import COLUMNS, FORMAT_NDJSON, log_exporter
+from .search import log_search
+
+TABLE_PREFIX = "lin_log_"
+TABLE_PATTERN = re.compile(r"^lin_log_(\d{6})$")
+
+
+def month_of(time):
+    return time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+class LogPartitions(object):
+    def __init__(self):
+        self.app = None
+        self.config = dict(
+            ENABLE=False,
+            HOT_MONTHS=1,
+            RETENTION=12,
+            ARCHIVE_DIR="logs/archive",
+            TTL=60,
+            BATCH_SIZE=5000,
+        )
+        self._metadata = MetaData()
+        self._lock = Lock()
+        # 已存在的分区月份，多 worker 部署时最多滞后 TTL 秒
+        self._months = None
+        self._expire_at = 0
+        # (分区表名, 筛选条件) -> 日志条数，已迁移的分区不再变动，与分区列表同样最多滞后 TTL 秒
+        self._counts = LRUCache(size=1024)
+
+    def init_app(self, app):
+        self.app = app
+        self.config.update(app.config.get("LOG_PARTITION", dict()))
+        self._counts.ttl = self.config["TTL"]
+
+    @staticmethod
+    def table_name(month):
+        return TABLE_PREFIX + month.strftime("%Y%m")
+
+    def table(self, month) -> Table:
+        """
+        分区表，结构与 lin_log 一致
+        """
+        name = self.table_name(month)
+        with self._lock:
+            table = self._metadata.tables.get(name)
+            if table is None:
+                table = Table(
+                    name,
+                    self._metadata,
+                    *(column.copy() for column in Log.__table__.columns),
+                    Index(name + "_create_time_id", "create_time", "id"),
+                )
+        return table
+
+    def months(self) -> list:
+        """
+        已迁移到分区表的月份，升序
+        """
+        if self._months is None or self._expire_at < time.monotonic():
+            names = inspect(db.engine).get_table_names()
+            self._months = sorted(
+                datetime.strptime(m.group(1), "%Y%m")
+                for m in map(TABLE_PATTERN.match, names)
+                if m
+            )
+            self._expire_at = time.monotonic() + self.config["TTL"]
+        return self._months
+
+    def overlapping(self, start=None, end=None) -> list:
+        """
+        与 [start, end] 有交集的分区月份，未指定时间段时为所有分区
+        """
+        if not self.config["ENABLE"]:
+            return []
+        start, end = _parse(start), _parse(end)
+        return [
+            month
+            for month in self.months()
+            if (start is None or add_months(month, 1) > start)
+            and (end is None or month <= end)
+        ]
+
+    def query(
+        self,
+        start=None,
+        end=None,
+        keyword=None,
+        name=None,
+        cursor=None,
+        count=None,
+        offset=0,
+    ):
+        """
+        日志查询：按关键字、人员、时间段（start 与 end 均传入时生效）筛选，
+        筛选条件下推到 lin_log 与各分区表的查询中，再合并作为 Log 的查询来源；
+        时间段早于 lin_log 中最早的日志时不再查询 lin_log。
+        传入 count 时按 (create_time, id) 倒序分页：游标定位、排序及本页所需的条数
+        同样下推到每个分支，各分支按索引只读取本页可能用到的行，不会对整个归档排序
+        """
+        start, end = _range(start, end)
+        hot = self.hot(start, end, keyword, name)
+        months = self.overlapping(start, end)
+        if not months:
+            return hot
+        tables = [self.table(month) for month in months]
+        sources = [
+            (table, self._filter(table, start, end, keyword, name)) for table in tables
+        ]
+        if end is None or self._oldest() <= _parse(end):
+            sources.insert(0, (Log.__table__, hot.statement))
+        if count is not None:
+            sources = [
+                (
+                    table,
+                    keyset_window(
+                        statement,
+                        [table.c.create_time, table.c.id],
+                        cursor,
+                        count,
+                        offset,
+                    )
+                    .alias()
+                    .select(),
+                )
+                for table, statement in sources
+            ]
+        # 恒假的 lin_log 分支不会被扫描，仅用于让 ORM 将 Log 的列对应到合并结果
+        statements = [Log.__table__.select().where(false())]
+        statements.extend(statement for _, statement in sources)
+        return Log.query.select_entity_from(
+            union_all(*statements).alias("lin_log_all")
+        )
+
+    def hot(self, start=None, end=None, keyword=None, name=None):
+        """
+        只查询 lin_log 的日志查询，筛选条件同 query
+        """
+        start, end = _range(start, end)
+        return self._filter(Log.__table__, start, end, keyword, name, Log.query)
+
+    def count(self, start=None, end=None, keyword=None, name=None) -> int:
+        """
+        与时间段有交集的分区表中符合筛选条件的日志条数合计，不含 lin_log；
+        各分区的计数分别缓存，迁移或删除分区后失效
+        """
+        start, end = _range(start, end)
+        filters = (start, end, keyword, name)
+        total = 0
+        for month in self.overlapping(start, end):
+            table = self.table(month)
+            key = (table.name, filters)
+            rows = self._counts.get(key)
+            if rows is None:
+                statement = self._filter(table, start, end, keyword, name)
+                with db.engine.connect() as conn:
+                    rows = conn.execute(
+                        select([func.count()]).select_from(statement.alias())
+                    ).scalar()
+                self._counts.set(key, rows)
+            total += rows
+        return total
+
+    def rotate(self, now=None) -> list:
+        """
+        将热数据保留期之前的月份按批迁移到分区表，返回迁移的分区表名
+        """
+        self._ensure_enabled()
+        now = now or datetime.now()
+        cutoff = add_months(month_of(now), -self.config["HOT_MONTHS"])
+        with db.engine.connect() as conn:
+            oldest = conn.execute(select([func.min(Log.create_time)])).scalar()
+        rotated = list()
+        if oldest is None:
+            return rotated
+        month = month_of(oldest)
+        while month < cutoff:
+            if self._move(month):
+                rotated.append(self.table_name(month))
+            month = add_months(month, 1)
+        if rotated:
+            count_cache.invalidate(Log.__tablename__)
+            self._counts.clear()
+            self._months = None
+        return rotated
+
+    def purge(self, now=None) -> list:
+        """
+        超过保留期的分区压缩导出到 ARCHIVE_DIR 后删除整表，返回导出的文件路径
+        """
+        self._ensure_enabled()
+        cutoff = add_months(
+            month_of(now or datetime.now()),
+            -(self.config["HOT_MONTHS"] + self.config["RETENTION"]),
+        )
+        directory = self.config["ARCHIVE_DIR"]
+        archived = list()
+        for month in self.months():
+            if month >= cutoff:
+                break
+            table = self.table(month)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, table.name + ".ndjson.gz")
+            with open(path + ".tmp", "wb") as f:
+                statement = select([table.c[c.key] for c in COLUMNS]).order_by(
+                    table.c.create_time, table.c.id
+                )
+                for chunk in log_exporter.stream(statement, FORMAT_NDJSON, True):
+                    f.write(chunk)
+            os.replace(path + ".tmp", path)
+            table.drop(bind=db.engine)
+            archived.append(path)
+        if archived:
+            # 日志列表合并了所有分区，删除分区后总数随之变化
+            count_cache.invalidate(Log.__tablename__)
+            self._counts.clear()
+            self._months = None
+        return archived
+
+    def _ensure_enabled(self):
+        # 未开启时日志查询不会读取分区表，迁移后的日志将无法查询
+        if not self.config["ENABLE"]:
+            raise RuntimeError("LOG_PARTITION.ENABLE 未开启，不能迁移或删除日志分区")
+
+    def _filter(self, table, start, end, keyword, name, query=None):
+        """
+        为 lin_log（传入 query 时使用 ORM 查询及全文索引）或分区表附加筛选条件
+        """
+        conditions = list()
+        if name:
+            conditions.append(table.c.username == name)
+        if start and end:
+            conditions.append(table.c.create_time.between(start, end))
+        if query is not None:
+            query = query.filter(*conditions)
+            return log_search.filter(query, keyword) if keyword else query
+        if keyword:
+            # 分区表没有全文索引
+            conditions.append(table.c.message.like(f"%{keyword}%"))
+        statement = table.select()
+        for condition in conditions:
+            statement = statement.where(condition)
+        return statement
+
+    @staticmethod
+    def _oldest():
+        """
+        lin_log 中最早的日志时间，lin_log 为空时为 datetime.max
+        """
+        with db.engine.connect() as conn:
+            oldest = conn.execute(select([func.min(Log.create_time)])).scalar()
+        return oldest or datetime.max
+
+    def _move(self, month):
+        """
+        按 id 分批将该月的日志迁移到分区表，每批一个短事务，避免长时间锁住 lin_log
+        """
+        source = Log.__table__
+        condition = and_(
+            source.c.create_time >= month, source.c.create_time < add_months(month, 1)
+        )
+        table = self.table(month)
+        columns = [c.name for c in source.columns]
+        moved = False
+        while True:
+            with db.engine.begin() as conn:
+                ids = [
+                    row.id
+                    for row in conn.execute(
+                        select([source.c.id])
+                        .where(condition)
+                        .order_by(source.c.id)
+                        .limit(self.config["BATCH_SIZE"])
+                    )
+                ]
+                if not ids:
+                    return moved
+                if not moved:
+                    table.create(bind=conn, checkfirst=True)
+                batch = source.c.id.in_(ids)
+                conn.execute(
+                    table.insert().from_select(columns, source.select().where(batch))
+                )
+                conn.execute(source.delete().where(batch))
+            moved = True
+
+
+def _range(start, end):
+    # 时间段需同时传入 start 与 end
+    return (start, end) if start and end else (None, None)
+
+
+def _parse(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+
+
+log_partitions = LogPartitions()
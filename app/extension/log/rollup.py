@@ -0,0 +1,212 @@
+"""
+    log rollup of Lin
+    ~~~~~~~~~
+
+    行为日志按小时 / 天汇总：日志批量写入时在同一事务中累加到汇总表，
+    统计接口只读取汇总表，不再对 lin_log 做 GROUP BY；
+    已有日志或汇总数据有误时通过 flask db rollup 回填
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from lin.db import db
+from lin.logger import Log
+from sqlalchemy import and_, bindparam, func, inspect, select
+from sqlalchemy.exc import DatabaseError
+
+from app.model.lin.log_rollup import LogRollupDay, LogRollupHour
+
+from .writer import log_writer
+
+GRANULARITY_HOUR = "hour"
+GRANULARITY_DAY = "day"
+
+MODELS = {
+    GRANULARITY_HOUR: LogRollupHour,
+    GRANULARITY_DAY: LogRollupDay,
+}
+
+DIMENSIONS = ("username", "permission", "path", "status_code")
+
+# 维度为空时的取值，与汇总表的默认值一致
+EMPTY = {"username": "", "permission": "", "path": "", "status_code": 0}
+
+
+def truncate(time, granularity):
+    """
+    时间所在时间桶的起始时间
+    """
+    if granularity == GRANULARITY_DAY:
+        return time.replace(hour=0, minute=0, second=0, microsecond=0)
+    return time.replace(minute=0, second=0, microsecond=0)
+
+
+class LogRollup(object):
+    def __init__(self):
+        self.app = None
+        self.config = dict(ENABLE=True, BATCH_SIZE=5000)
+        # 汇总表不存在（尚未执行 flask db index）时不汇总
+        self.ready = False
+
+    def init_app(self, app):
+        self.app = app
+        self.config.update(app.config.get("LOG_ROLLUP", dict()))
+        log_writer.on_flush(self.on_flush)
+        with app.app_context():
+            try:
+                self.ready = self._has_tables()
+            except DatabaseError:
+                pass
+
+    def create_tables(self) -> list:
+        """
+        创建汇总表，返回新建的表名
+        """
+        existing = set(inspect(db.engine).get_table_names())
+        created = list()
+        for model in MODELS.values():
+            if model.__tablename__ not in existing:
+                model.__table__.create(bind=db.engine)
+                created.append(model.__tablename__)
+        self.ready = True
+        return created
+
+    def on_flush(self, conn, rows):
+        """
+        日志批量写入后的回调，累加到各汇总表
+        """
+        if not self.ready or not self.config["ENABLE"]:
+            return
+        for granularity in MODELS:
+            self.apply(conn, granularity, self.aggregate(rows, granularity))
+
+    @staticmethod
+    def aggregate(rows, granularity) -> Counter:
+        """
+        按 (时间桶, 维度...) 汇总日志条数
+        """
+        counts = Counter()
+        for row in rows:
+            bucket = truncate(row["create_time"], granularity)
+            key = (bucket,) + tuple(
+                EMPTY[d] if row.get(d) is None else row[d] for d in DIMENSIONS
+            )
+            counts[key] += 1
+        return counts
+
+    def apply(self, conn, granularity, counts):
+        """
+        累加汇总结果：已存在的行增加次数，不存在的行插入
+        """
+        if not counts:
+            return
+        table = MODELS[granularity].__table__
+        columns = ("bucket",) + DIMENSIONS
+        values = [dict(zip(columns, key), count=n) for key, n in counts.items()]
+        dialect = conn.dialect.name
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+
+            stmt = insert(table)
+            conn.execute(
+                stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted.count),
+                values,
+            )
+            return
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+
+            stmt = insert(table)
+            conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=list(columns),
+                    set_=dict(count=table.c.count + stmt.excluded.count),
+                ),
+                values,
+            )
+            return
+        # 其他数据库先更新再插入，SQLite 的写事务互斥，不会并发插入重复行
+        update = (
+            table.update()
+            .where(and_(*(table.c[c] == bindparam("_" + c) for c in columns)))
+            .values(count=table.c.count + bindparam("_count"))
+        )
+        missing = list()
+        for value in values:
+            params = {"_" + k: v for k, v in value.items()}
+            if conn.execute(update, params).rowcount == 0:
+                missing.append(value)
+        if missing:
+            conn.execute(table.insert(), missing)
+
+    def backfill(self, start=None, end=None) -> int:
+        """
+        按 lin_log 重新计算 start 至 end 当天的汇总数据，范围按天对齐，返回处理的日志条数
+        """
+        if start is not None:
+            start = truncate(start, GRANULARITY_DAY)
+        if end is not None:
+            end = truncate(end, GRANULARITY_DAY) + timedelta(days=1)
+        conditions = [Log.delete_time == None]
+        if start is not None:
+            conditions.append(Log.create_time >= start)
+        if end is not None:
+            conditions.append(Log.create_time < end)
+        statement = (
+            select([Log.create_time] + [getattr(Log, d) for d in DIMENSIONS])
+            .where(and_(*conditions))
+            .order_by(Log.create_time)
+        )
+        engine = db.get_engine(self.app) if self.app else db.engine
+        total = 0
+        with engine.connect() as reader, engine.begin() as conn:
+            for model in MODELS.values():
+                delete = model.__table__.delete()
+                if start is not None:
+                    delete = delete.where(model.bucket >= start)
+                if end is not None:
+                    delete = delete.where(model.bucket < end)
+                conn.execute(delete)
+            result = reader.execution_options(stream_results=True).execute(statement)
+            while True:
+                rows = result.fetchmany(self.config["BATCH_SIZE"])
+                if not rows:
+                    break
+                rows = [dict(row) for row in rows]
+                for granularity in MODELS:
+                    self.apply(conn, granularity, self.aggregate(rows, granularity))
+                total += len(rows)
+            # SQLite 提交前需释放读连接的共享锁
+            result.close()
+        self.ready = True
+        return total
+
+    def query(self, granularity, start=None, end=None, dimensions=()) -> list:
+        """
+        按时间桶统计次数，可按维度细分
+        """
+        model = MODELS[granularity]
+        columns = [getattr(model, d) for d in dimensions]
+        query = db.session.query(
+            model.bucket, *columns, func.sum(model.count).label("count")
+        )
+        if start is not None:
+            query = query.filter(model.bucket >= truncate(start, granularity))
+        if end is not None:
+            query = query.filter(model.bucket <= end)
+        rows = query.group_by(model.bucket, *columns).order_by(model.bucket).all()
+        return [
+            dict(zip(dimensions, row[1:-1]), time=row.bucket, count=int(row.count))
+            for row in rows
+        ]
+
+    @staticmethod
+    def _has_tables():
+        existing = set(inspect(db.engine).get_table_names())
+        return all(model.__tablename__ in existing for model in MODELS.values())
+
+
+log_rollup = LogRollup()
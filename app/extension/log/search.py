@@ -0,0 +1,121 @@
+"""
+    log search of Lin
+    ~~~~~~~~~
+
+    日志 message 全文检索：
+    SQLite 使用 FTS5 trigram 外部内容表，由触发器随 lin_log 写入维护；
+    MySQL 使用 ngram 分词的 FULLTEXT 索引；
+    其他数据库、索引不存在或关键字短于分词长度时回退到 LIKE
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from lin.db import db
+from lin.logger import Log
+from sqlalchemy import inspect, text
+
+FTS_TABLE = "lin_log_fts"
+FULLTEXT_INDEX = "log_message_fulltext"
+
+SQLITE_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(message, content='lin_log', content_rowid='id', tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS lin_log_fts_ai AFTER INSERT ON lin_log BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS lin_log_fts_ad AFTER DELETE ON lin_log BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message)
+        VALUES ('delete', old.id, old.message);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS lin_log_fts_au AFTER UPDATE OF message ON lin_log BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message)
+        VALUES ('delete', old.id, old.message);
+        INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+
+class LogSearch(object):
+    def __init__(self):
+        self.app = None
+        self.config = dict(ENABLE=True, MIN_LENGTH=3)
+        self._backend = None
+
+    def init_app(self, app):
+        self.app = app
+        self.config.update(app.config.get("LOG_SEARCH", dict()))
+
+    @property
+    def backend(self):
+        """
+        当前可用的全文检索后端：sqlite / mysql / None
+        """
+        if self._backend is None:
+            self._backend = self._detect() or ""
+        return self._backend or None
+
+    def create_index(self) -> list:
+        """
+        创建全文索引并回填已有日志，返回新建的索引名
+        """
+        dialect = db.engine.dialect.name
+        created = list()
+        if dialect == "sqlite" and not self._has_fts_table():
+            with db.engine.begin() as conn:
+                for ddl in SQLITE_DDL:
+                    conn.execute(text(ddl))
+            created.append(FTS_TABLE)
+        elif dialect == "mysql" and not self._has_fulltext_index():
+            with db.engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE lin_log ADD FULLTEXT INDEX {FULLTEXT_INDEX} "
+                        "(message) WITH PARSER ngram"
+                    )
+                )
+            created.append(FULLTEXT_INDEX)
+        self._backend = None
+        return created
+
+    def filter(self, query, keyword, fulltext=True):
+        """
+        按关键字过滤日志 message，fulltext 为 False 时（如查询归档分区）使用 LIKE
+        """
+        backend = self.backend if fulltext else None
+        if backend is None or len(keyword) < self.config["MIN_LENGTH"]:
+            return query.filter(Log.message.like(f"%{keyword}%"))
+        if backend == "sqlite":
+            phrase = '"{}"'.format(keyword.replace('"', '""'))
+            matched = text(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :phrase"
+            ).bindparams(phrase=phrase)
+            return query.filter(Log.id.in_(matched))
+        phrase = '"{}"'.format(keyword.replace('"', " "))
+        return query.filter(
+            text("MATCH (lin_log.message) AGAINST (:phrase IN BOOLEAN MODE)").bindparams(
+                phrase=phrase
+            )
+        )
+
+    def _detect(self):
+        if not self.config["ENABLE"]:
+            return None
+        dialect = db.engine.dialect.name
+        if dialect == "sqlite" and self._has_fts_table():
+            return "sqlite"
+        if dialect == "mysql" and self._has_fulltext_index():
+            return "mysql"
+        return None
+
+    @staticmethod
+    def _has_fts_table():
+        return FTS_TABLE in inspect(db.engine).get_table_names()
+
+    @staticmethod
+    def _has_fulltext_index():
+        indexes = inspect(db.engine).get_indexes("lin_log")
+        return any(i["name"] == FULLTEXT_INDEX for i in indexes)
+
+
+log_search = LogSearch()
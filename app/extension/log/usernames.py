@@ -0,0 +1,136 @@
+"""
+    log usernames of Lin
+    ~~~~~~~~~
+
+    记录过行为日志的用户名：日志批量写入时在同一事务中增量写入 lin_log_username，
+    查询时直接读取该表，成本与日志量无关
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from threading import Lock
+
+from lin.db import db
+from lin.logger import Log
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import DatabaseError, IntegrityError
+
+from app.model.lin.log_username import LogUsername
+from app.util.common import insert_ignore
+
+from .writer import log_writer
+
+
+class LogUsernames(object):
+    def __init__(self):
+        self.app = None
+        # 表不存在（尚未执行 flask db index）时回退到对日志表分组查询
+        self.ready = False
+        # 本进程已确认写入过的用户名，避免重复写入
+        self._known = set()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.app = app
+        log_writer.on_flush(self.on_flush)
+        with app.app_context():
+            try:
+                self.warm()
+            except DatabaseError:
+                pass
+
+    def warm(self):
+        """
+        加载已记录的用户名，表为空而日志表中已有数据时先回填
+        """
+        if LogUsername.__tablename__ not in inspect(db.engine).get_table_names():
+            self.ready = False
+            return
+        usernames = self._select(db.engine)
+        if not usernames:
+            try:
+                self.backfill()
+            except IntegrityError:
+                # 多个 worker 同时启动时，其他 worker 已完成回填
+                pass
+            usernames = self._select(db.engine)
+        with self._lock:
+            self._known = set(usernames)
+        self.ready = True
+
+    def create_table(self) -> list:
+        """
+        创建用户名表并回填，返回新建的表名
+        """
+        created = list()
+        if LogUsername.__tablename__ not in inspect(db.engine).get_table_names():
+            LogUsername.__table__.create(bind=db.engine)
+            created.append(LogUsername.__tablename__)
+        self.warm()
+        return created
+
+    def backfill(self):
+        """
+        从日志表中回填用户名，忽略已存在的用户名，可与其他 worker 并发执行
+        """
+        distinct = (
+            select([Log.username])
+            .where(Log.username != None)
+            .where(Log.delete_time == None)
+            .distinct()
+        )
+        with db.engine.begin() as conn:
+            conn.execute(
+                insert_ignore(LogUsername.__table__, conn.dialect.name).from_select(
+                    ["username"], distinct
+                )
+            )
+
+    def all(self) -> list:
+        if not self.ready:
+            return [
+                u.username
+                for u in db.session.query(Log.username)
+                .filter_by(soft=False)
+                .group_by(Log.username)
+                .all()
+                if u.username
+            ]
+        return [
+            u.username
+            for u in db.session.query(LogUsername.username)
+            .order_by(LogUsername.username)
+            .all()
+        ]
+
+    def on_flush(self, conn, rows):
+        """
+        日志批量写入后的回调，写入新出现的用户名
+        """
+        if not self.ready:
+            return
+        usernames = {row["username"] for row in rows if row.get("username")}
+        new = usernames - self._known
+        if not new:
+            return
+        table = LogUsername.__table__
+        # 其他进程可能已写入，先过滤已存在的用户名
+        existing = conn.execute(
+            select([table.c.username]).where(table.c.username.in_(new))
+        )
+        new -= {row.username for row in existing}
+        if new:
+            conn.execute(
+                insert_ignore(table, conn.dialect.name),
+                [{"username": username} for username in new],
+            )
+        with self._lock:
+            self._known |= usernames
+
+    @staticmethod
+    def _select(bind):
+        table = LogUsername.__table__
+        return [row.username for row in bind.execute(select([table.c.username]))]
+
+
+log_usernames = LogUsernames()
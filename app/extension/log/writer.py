@@ -0,0 +1,176 @@
+"""
+    log writer of Lin
+    ~~~~~~~~~
+
+    行为日志的异步批量写入：请求中只把日志放入进程内的有界队列，
+    由后台线程按条数或时间间隔合并为多行 INSERT 写入
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from lin.db import db
+from lin.logger import Log
+
+# 队列满时的处理策略
+POLICY_BLOCK = "block"  # 阻塞等待，超时后同步写入
+POLICY_DROP = "drop"  # 丢弃新日志
+POLICY_SYNC = "sync"  # 直接在请求中同步写入
+
+FIELDS = (
+    "message",
+    "user_id",
+    "username",
+    "status_code",
+    "method",
+    "path",
+    "permission",
+)
+
+
+class LogWriter(object):
+    def __init__(self):
+        self.app = None
+        self.config = dict(
+            ENABLE=True,
+            QUEUE_SIZE=10000,
+            BATCH_SIZE=100,
+            INTERVAL=500,
+            POLICY=POLICY_BLOCK,
+            TIMEOUT=1,
+        )
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        # 每批日志写入后的回调，参数为 (connection, rows)
+        self._flush_handlers = list()
+
+    def init_app(self, app):
+        self.app = app
+        self.config.update(app.config.get("LOG_WRITER", dict()))
+        self._queue = queue.Queue(maxsize=self.config["QUEUE_SIZE"])
+        atexit.register(self.close)
+
+    def on_flush(self, handler):
+        """
+        注册日志批量写入后的回调，与写入在同一事务中执行
+        """
+        self._flush_handlers.append(handler)
+        return handler
+
+    def write(self, **kwargs):
+        row = {key: kwargs.get(key) for key in FIELDS}
+        row["create_time"] = row["update_time"] = datetime.now()
+        if not self.config["ENABLE"] or self.app is None:
+            self._write_rows([row])
+            return
+        self._ensure_started()
+        policy = self.config["POLICY"]
+        try:
+            if policy == POLICY_BLOCK:
+                self._queue.put(row, timeout=self.config["TIMEOUT"])
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            if policy == POLICY_DROP:
+                self.dropped += 1
+                return
+            self._write_rows([row])
+
+    def flush(self):
+        """
+        将队列中的日志全部写入，并等待后台线程正在处理的批次完成
+        """
+        if self._queue is None:
+            return
+        while True:
+            rows = self._drain(self.config["BATCH_SIZE"])
+            if not rows:
+                break
+            self._write_batch(rows)
+        if self._is_running():
+            self._queue.join()
+
+    def close(self):
+        self._stopping.set()
+        if self._is_running():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _ensure_started(self):
+        # gunicorn 预加载后 fork 出的 worker 需要重新启动后台线程
+        if self._is_running():
+            return
+        with self._lock:
+            if self._is_running():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="log-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _is_running(self):
+        return (
+            self._thread is not None
+            and self._thread.is_alive()
+            and self._pid == os.getpid()
+        )
+
+    def _run(self):
+        interval = self.config["INTERVAL"] / 1000
+        batch_size = self.config["BATCH_SIZE"]
+        while not self._stopping.is_set():
+            rows = list()
+            deadline = time.monotonic() + interval
+            while len(rows) < batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if rows:
+                self._write_batch(rows)
+
+    def _drain(self, limit):
+        rows = list()
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _write_batch(self, rows):
+        """
+        写入一批队列中的日志，写入失败时记录异常并丢弃该批，不影响后续批次
+        """
+        try:
+            self._write_rows(rows)
+        except Exception:
+            self.app.logger.exception("行为日志写入失败，丢弃 %d 条", len(rows))
+        finally:
+            for _ in rows:
+                self._queue.task_done()
+
+    def _write_rows(self, rows):
+        engine = db.get_engine(self.app) if self.app else db.engine
+        with engine.begin() as conn:
+            conn.execute(Log.__table__.insert().values(rows))
+            for handler in self._flush_handlers:
+                handler(conn, rows)
+
+
+log_writer = LogWriter()
@@ -0,0 +1,209 @@
+"""
+    password hasher of Lin
+    ~~~~~~~~~
+
+    可插拔的密码哈希方案，哈希计算放到线程池/进程池中执行，
+    gevent worker 下通过 hub 的原生线程池执行，不会阻塞其他协程
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import base64
+import hashlib
+import hmac
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+from flask import current_app
+from werkzeug.security import check_password_hash, gen_salt, generate_password_hash
+
+
+class Pbkdf2Scheme(object):
+    """
+    werkzeug 格式：pbkdf2:sha256:150000$salt$hash，兼容已有的密码记录
+    """
+
+    name = "pbkdf2"
+
+    @staticmethod
+    def hash(raw, digest="sha256", iterations=150000, salt_length=8):
+        method = "pbkdf2:{digest}:{iterations}".format(
+            digest=digest, iterations=iterations
+        )
+        return generate_password_hash(raw, method=method, salt_length=salt_length)
+
+    @staticmethod
+    def verify(pwhash, raw):
+        return check_password_hash(pwhash, raw)
+
+    @staticmethod
+    def params(pwhash) -> dict:
+        method = pwhash.split("$", 1)[0].split(":")
+        return {
+            "digest": method[1] if len(method) > 1 else None,
+            "iterations": int(method[2]) if len(method) > 2 else 150000,
+        }
+
+
+class ScryptScheme(object):
+    """
+    格式：scrypt:n:r:p$salt$hash
+    """
+
+    name = "scrypt"
+
+    @staticmethod
+    def hash(raw, n=2 ** 14, r=8, p=1, salt_length=16):
+        salt = gen_salt(salt_length)
+        key = ScryptScheme._derive(raw, salt, n, r, p)
+        return "scrypt:{n}:{r}:{p}${salt}${key}".format(
+            n=n, r=r, p=p, salt=salt, key=key
+        )
+
+    @staticmethod
+    def verify(pwhash, raw):
+        _, salt, key = pwhash.split("$", 2)
+        params = ScryptScheme.params(pwhash)
+        return hmac.compare_digest(
+            ScryptScheme._derive(raw, salt, params["n"], params["r"], params["p"]),
+            key,
+        )
+
+    @staticmethod
+    def params(pwhash) -> dict:
+        _, n, r, p = pwhash.split("$", 1)[0].split(":")
+        return {"n": int(n), "r": int(r), "p": int(p)}
+
+    @staticmethod
+    def _derive(raw, salt, n, r, p):
+        key = hashlib.scrypt(
+            raw.encode("utf-8"),
+            salt=salt.encode("utf-8"),
+            n=n,
+            r=r,
+            p=p,
+            maxmem=128 * n * r * p + 1024 * 1024,
+        )
+        return base64.b64encode(key).decode("ascii")
+
+
+class PasswordHasher(object):
+    schemes = {scheme.name: scheme for scheme in (Pbkdf2Scheme, ScryptScheme)}
+
+    def __init__(self):
+        self._executors = dict()
+        self._lock = Lock()
+
+    def register(self, scheme):
+        """
+        注册自定义哈希方案，需提供 name、hash、verify、params
+        """
+        self.schemes[scheme.name] = scheme
+        return scheme
+
+    def hash(self, raw) -> str:
+        scheme, params = self._configured()
+        return self._run(scheme.hash, raw, **params)
+
+    def hash_many(self, raws) -> list:
+        """
+        批量哈希，用于批量导入用户：与单个哈希相同，按 EXECUTOR 配置同步计算
+        或在线程池/进程池中并行计算，gevent worker 下使用 hub 的原生线程池
+        """
+        raws = list(raws)
+        if not raws:
+            return raws
+        scheme, params = self._configured()
+        fn = partial(scheme.hash, **params)
+        config = self._config()
+        mode = config.get("EXECUTOR")
+        if not mode:
+            return [fn(raw) for raw in raws]
+        hub = _gevent_hub()
+        if hub is not None:
+            return list(hub.threadpool.imap(fn, raws))
+        workers = config.get("WORKERS") or 4
+        executor = self._executor(mode, workers)
+        return list(executor.map(fn, raws, chunksize=max(1, len(raws) // workers)))
+
+    def verify(self, pwhash, raw) -> bool:
+        if not pwhash:
+            return False
+        scheme = self._scheme_of(pwhash)
+        # 未知格式交由 werkzeug 处理（兼容明文、md5、sha1 等旧记录）
+        verify = scheme.verify if scheme else check_password_hash
+        return self._run(verify, pwhash, raw)
+
+    def needs_rehash(self, pwhash) -> bool:
+        """
+        已有哈希的方案或成本参数与当前配置不一致时，需要在登录成功后重新哈希
+        """
+        scheme, params = self._configured()
+        if self._scheme_of(pwhash) is not scheme:
+            return True
+        current = scheme.params(pwhash)
+        return any(
+            key in current and current[key] != value for key, value in params.items()
+        )
+
+    def _scheme_of(self, pwhash):
+        name = pwhash.split("$", 1)[0].split(":", 1)[0]
+        return self.schemes.get(name)
+
+    def _configured(self):
+        config = self._config()
+        scheme = self.schemes[config.get("SCHEME", Pbkdf2Scheme.name)]
+        params = {k.lower(): v for k, v in config.get("PARAMS", dict()).items()}
+        return scheme, params
+
+    def _run(self, fn, *args, **kwargs):
+        config = self._config()
+        mode = config.get("EXECUTOR")
+        if not mode:
+            return fn(*args, **kwargs)
+        hub = _gevent_hub()
+        if hub is not None:
+            # 线程已被 gevent patch 为协程，使用 hub 的原生线程池
+            return hub.threadpool.apply(fn, args, kwargs)
+        executor = self._executor(mode, config.get("WORKERS"))
+        return executor.submit(fn, *args, **kwargs).result()
+
+    def _executor(self, mode, workers):
+        executor = self._executors.get(mode)
+        if executor is None:
+            with self._lock:
+                executor = self._executors.get(mode)
+                if executor is None:
+                    if mode == "process":
+                        executor = ProcessPoolExecutor(max_workers=workers)
+                    else:
+                        executor = ThreadPoolExecutor(
+                            max_workers=workers, thread_name_prefix="password"
+                        )
+                    self._executors[mode] = executor
+        return executor
+
+    def shutdown(self):
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+            self._executors.clear()
+
+    @staticmethod
+    def _config():
+        return current_app.config.get("PASSWORD_HASH", dict())
+
+
+def _gevent_hub():
+    try:
+        from gevent import get_hub
+        from gevent.monkey import is_module_patched
+    except ImportError:
+        return None
+    if not is_module_patched("threading"):
+        return None
+    return get_hub()
+
+
+password_hasher = PasswordHasher()
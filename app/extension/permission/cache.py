@@ -0,0 +1,122 @@
+"""
+    permission cache of Lin
+    ~~~~~~~~~
+
+    进程内的用户权限缓存，缓存用户所属分组id及其权限掩码，
+    LRU 淘汰，并通过全局的权限版本号失效；
+    变动时同时递增所有 worker 共享的权限版本号，读取到其他 worker 递增后的版本号时同样失效
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from collections import namedtuple
+
+from lin import manager
+
+from app.extension.cache.lru import LRUCache
+
+from .registry import permission_registry
+from .version import acl_version
+
+# 缓存条目：写入时的权限版本号、注册表代数、分组id列表、权限掩码
+Entry = namedtuple("entry", ["version", "generation", "group_ids", "mask"])
+
+
+class PermissionCache(object):
+    def __init__(self, size=1024, ttl=60):
+        self._entries = LRUCache("PERMISSION_CACHE", size=size, ttl=ttl)
+        self._version = 0
+        # 最近一次读取到的共享权限版本号
+        self._shared = None
+
+    @property
+    def version(self):
+        return self._version
+
+    def bump(self):
+        """
+        分组、权限、用户分组关系发生变动时调用，使所有缓存条目失效，
+        并递增共享的权限版本号，其他 worker 读取到新的版本号后同样失效
+        """
+        self._invalidate()
+        shared = acl_version.bump()
+        with self._entries.lock:
+            if shared is not None:
+                self._shared = shared
+        return self._version
+
+    def observe(self, shared):
+        """
+        传入读取到的共享权限版本号，与上次读取到的不同时使所有缓存条目失效
+        """
+        if shared is None or shared == self._shared:
+            return
+        with self._entries.lock:
+            if shared != self._shared:
+                self._shared = shared
+                self._invalidate()
+
+    def _invalidate(self):
+        with self._entries.lock:
+            self._version += 1
+            self._entries.clear()
+            permission_registry.invalidate()
+
+    def get(self, user_id) -> Entry:
+        """
+        获取用户的分组id和权限掩码，未命中或已失效时从数据库加载
+        """
+        version = self._version
+        generation = self.warm()
+        entry = self._entries.get(
+            user_id,
+            lambda e: e.version == self._version and e.generation == generation,
+        )
+        if entry is None:
+            entry = self._load(user_id, version, generation)
+            self._store(user_id, entry)
+        return entry
+
+    def warm(self):
+        """
+        构建权限位图注册表
+        """
+        return permission_registry.ensure(self._version, self._entries.default_ttl)
+
+    def get_group_ids(self, user_id) -> list:
+        return self.get(user_id).group_ids
+
+    def get_permissions(self, user_id) -> list:
+        """
+        按模块分组的权限列表 [{module: [{"permission": name, "module": module}]}]
+        """
+        return permission_registry.permissions_of(self.get(user_id).mask)
+
+    def is_admin_by_group_ids(self, group_ids) -> bool:
+        self.warm()
+        return permission_registry.is_admin(group_ids)
+
+    def is_allowed_by_group_ids(self, group_ids, endpoint) -> bool:
+        """
+        查看分组有无权限访问 endpoint 对应的路由函数
+        """
+        self.warm()
+        mask = permission_registry.mask_of(group_ids)
+        return permission_registry.is_allowed(mask, endpoint)
+
+    def _store(self, user_id, entry):
+        with self._entries.lock:
+            # 加载期间权限发生了变动，则不写入缓存
+            if entry.version == self._version:
+                self._entries.set(user_id, entry)
+
+    def _load(self, user_id, version, generation) -> Entry:
+        group_ids = manager.find_group_ids_by_user_id(user_id)
+        mask = permission_registry.mask_of(group_ids)
+        return Entry(version, generation, group_ids, mask)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+permission_cache = PermissionCache()
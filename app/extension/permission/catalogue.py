@@ -0,0 +1,69 @@
+"""
+    permission catalogue of Lin
+    ~~~~~~~~~
+
+    可分配权限目录：启动时按模块汇总已挂载的权限并预先序列化为字节，
+    以内容摘要作为强 ETag，请求携带相同的 If-None-Match 时直接返回 304；
+    权限发生变动（权限版本号变化）或超过有效期时重建
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import hashlib
+import time
+from threading import RLock
+
+from flask import current_app, json, request
+from lin import get_ep_infos
+
+from .cache import permission_cache
+
+
+class PermissionCatalogue(object):
+    def __init__(self, ttl=60):
+        self._lock = RLock()
+        self._body = None
+        self._etag = None
+        self._version = None
+        self._expire_at = 0
+        self.ttl = ttl
+
+    def ensure(self):
+        """
+        返回序列化后的权限目录及其 ETag，必要时重建
+        """
+        version = permission_cache.version
+        if self._version != version or self._expire_at < time.monotonic():
+            with self._lock:
+                if self._version != version or self._expire_at < time.monotonic():
+                    self.build()
+                    self._version = version
+                    self._expire_at = time.monotonic() + self._ttl()
+        return self._body, self._etag
+
+    def build(self):
+        body = json.dumps(get_ep_infos()).encode("utf-8")
+        # 内容不变时 ETag 不变，重建不会使客户端缓存失效
+        self._etag = hashlib.sha1(body).hexdigest()
+        self._body = body
+
+    def invalidate(self):
+        self._version = None
+
+    def response(self):
+        """
+        权限目录响应，If-None-Match 命中时为 304
+        """
+        body, etag = self.ensure()
+        response = current_app.response_class(body, mimetype="application/json")
+        response.set_etag(etag)
+        # 客户端可以缓存，但每次使用前需携带 ETag 重新验证
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def _ttl(self):
+        return current_app.config.get("PERMISSION_CACHE", dict()).get("TTL", self.ttl)
+
+
+permission_catalogue = PermissionCatalogue()
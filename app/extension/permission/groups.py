@@ -0,0 +1,93 @@
+"""
+    group cache of Lin
+    ~~~~~~~~~
+
+    进程内的分组字典缓存：分组很少变动，整表缓存为 {id: 分组信息}，
+    lin_group 有写入并提交后失效，TTL 用于限制其他 worker 的缓存滞后时间
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import time
+from threading import RLock
+
+from flask import current_app
+from lin import manager
+from lin.db import db
+from lin.enums import GroupLevelEnum
+
+from app.extension.cache.hooks import on_tables_changed
+
+# 缓存的分组字段，与 Group 序列化后的字段一致
+FIELDS = ("id", "name", "info", "level")
+
+
+class GroupCache(object):
+    def __init__(self, ttl=60):
+        self._lock = RLock()
+        self._groups = None
+        self._expire_at = 0
+        self.ttl = ttl
+
+    def all(self) -> dict:
+        """
+        所有未删除的分组 {id: {"id", "name", "info", "level"}}
+        """
+        groups = self._groups
+        if groups is None or self._expire_at < time.monotonic():
+            with self._lock:
+                if self._groups is None or self._expire_at < time.monotonic():
+                    self._groups = self._load()
+                    self._expire_at = time.monotonic() + self._ttl()
+                groups = self._groups
+        return groups
+
+    def get(self, group_id):
+        return self.all().get(group_id)
+
+    def get_many(self, group_ids) -> list:
+        groups = self.all()
+        return [groups[gid] for gid in group_ids if gid in groups]
+
+    def ids_of_level(self, level) -> list:
+        return [g["id"] for g in self.all().values() if g["level"] == level]
+
+    @property
+    def root_ids(self) -> list:
+        return self.ids_of_level(GroupLevelEnum.ROOT.value)
+
+    @property
+    def root_id(self):
+        ids = self.root_ids
+        return ids[0] if ids else None
+
+    @property
+    def guest_id(self):
+        ids = self.ids_of_level(GroupLevelEnum.GUEST.value)
+        return ids[0] if ids else None
+
+    def invalidate(self):
+        with self._lock:
+            self._groups = None
+
+    @staticmethod
+    def _load():
+        model = manager.group_model
+        rows = (
+            db.session.query(*(getattr(model, f) for f in FIELDS))
+            .filter(model.delete_time == None)
+            .order_by(model.id)
+            .all()
+        )
+        return {row.id: dict(zip(FIELDS, row)) for row in rows}
+
+    def _ttl(self):
+        return current_app.config.get("PERMISSION_CACHE", dict()).get("TTL", self.ttl)
+
+
+group_cache = GroupCache()
+
+
+@on_tables_changed("lin_group")
+def _invalidate(tables):
+    group_cache.invalidate()
@@ -0,0 +1,161 @@
+"""
+    jwt of Lin
+    ~~~~~~~~~
+
+    基于权限缓存的令牌签发与鉴权装饰器
+
+    开启 JWT_PERMISSION_CLAIMS 后，access token 中会携带用户所属分组id、
+    是否为超级管理员以及签发时所有 worker 共享的权限版本号。
+    鉴权时版本号未变则直接使用令牌中的信息，不加载用户；
+    版本号已变时加载用户、校验其激活状态，并从权限缓存读取分组。
+    未开启时每次请求都会加载用户并校验其激活状态
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from functools import wraps
+
+from flask import current_app, request
+from flask_jwt_extended import (
+    create_access_token,
+    create_refresh_token,
+    get_current_user,
+    get_jwt_claims,
+    get_jwt_identity,
+    verify_jwt_in_request,
+)
+from lin import manager
+from lin.exception import UnAuthentication
+from lin.jwt import SCOPE, jwt, user_loader_callback
+from werkzeug.local import LocalProxy
+
+from .cache import permission_cache
+from .version import acl_version
+
+__all__ = [
+    "admin_required",
+    "group_required",
+    "get_tokens",
+    "refresh_tokens",
+    "init_app",
+]
+
+
+def init_app(app):
+    """
+    替换 Lin 的用户加载函数：开启 JWT_PERMISSION_CLAIMS 时延迟加载用户
+    """
+    jwt.user_loader_callback_loader(_load_user)
+
+
+def admin_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        _, _, is_admin = _authorize()
+        if not is_admin:
+            raise UnAuthentication("只有超级管理员可操作")
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def group_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        _, group_ids, is_admin = _authorize()
+        # not admin
+        if not is_admin:
+            if not group_ids:
+                raise UnAuthentication("您还不属于任何分组，请联系超级管理员获得权限")
+            if not permission_cache.is_allowed_by_group_ids(
+                group_ids, request.endpoint
+            ):
+                raise UnAuthentication("权限不够，请联系超级管理员获得权限")
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def get_tokens(user, verify_remote_addr=False):
+    identity = dict(uid=user.id, scope=SCOPE)
+    if verify_remote_addr:
+        identity["remote_addr"] = request.remote_addr
+    return _create_tokens(identity)
+
+
+def refresh_tokens(identity):
+    return _create_tokens(dict(identity))
+
+
+def _create_tokens(identity):
+    user_claims = None
+    if _is_claims_enabled():
+        # 先读取版本号再查询分组，期间发生的变动只会使令牌中的版本号过期
+        version = acl_version.get()
+        permission_cache.observe(version)
+        group_ids = manager.find_group_ids_by_user_id(identity["uid"])
+        user_claims = {
+            "uid": identity["uid"],
+            "scope": identity["scope"],
+            "remote_addr": identity.get("remote_addr"),
+            "groups": group_ids,
+            "admin": permission_cache.is_admin_by_group_ids(group_ids),
+            "acl": version,
+        }
+    access_token = create_access_token(identity=identity, user_claims=user_claims)
+    refresh_token = create_refresh_token(identity=identity)
+    return access_token, refresh_token
+
+
+def _authorize():
+    """
+    校验 access token，返回用户id、所属分组id、是否为超级管理员
+    """
+    verify_jwt_in_request()
+    if _is_claims_enabled():
+        version = acl_version.get()
+        permission_cache.observe(version)
+        claims = get_jwt_claims()
+        if version is not None and claims.get("acl") == version:
+            uid = get_jwt_identity()["uid"]
+            return uid, claims.get("groups", []), claims.get("admin", False)
+    # 未开启或权限版本号已变动，加载用户并从权限缓存读取分组
+    current_user = get_current_user()
+    # 判断当前用户是否为激活状态
+    _check_is_active(current_user)
+    group_ids = permission_cache.get_group_ids(current_user.id)
+    return (
+        current_user.id,
+        group_ids,
+        permission_cache.is_admin_by_group_ids(group_ids),
+    )
+
+
+def _load_user(identity):
+    """
+    开启 JWT_PERMISSION_CLAIMS 时 scope、remote_addr 立即校验，
+    用户在首次访问 get_current_user() 返回的对象时才查询
+    """
+    if not _is_claims_enabled():
+        return user_loader_callback(identity)
+    if identity.get("scope") != SCOPE:
+        raise UnAuthentication()
+    if identity.get("remote_addr") and identity["remote_addr"] != request.remote_addr:
+        raise UnAuthentication()
+    loaded = list()
+
+    def load():
+        if not loaded:
+            loaded.append(user_loader_callback(identity))
+        return loaded[0]
+
+    return LocalProxy(load)
+
+
+def _is_claims_enabled():
+    return current_app.config.get("JWT_PERMISSION_CLAIMS", False)
+
+
+def _check_is_active(current_user):
+    if not current_user.is_active:
+        raise UnAuthentication("您目前处于未激活状态，请联系超级管理员")
@@ -0,0 +1,146 @@
+"""
+    permission registry of Lin
+    ~~~~~~~~~
+
+    权限位图注册表：为每条已挂载的权限分配一个位序号，
+    每个分组的权限编译为一个整数掩码，鉴权即一次位运算
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import time
+from collections import OrderedDict
+from threading import RLock
+
+from lin import manager
+from lin.db import db
+from lin.enums import GroupLevelEnum
+
+from app.extension.cache.hooks import on_tables_changed
+
+# 变动后需要重建注册表的表
+WATCHED_TABLES = ("lin_permission", "lin_group_permission")
+
+
+class PermissionRegistry(object):
+    def __init__(self):
+        self._lock = RLock()
+        # (module, name) -> 位序号
+        self._bits = dict()
+        # 位序号 -> (module, name)
+        self._permissions = list()
+        # group_id -> 权限掩码
+        self._group_masks = dict()
+        # module -> 该模块所有权限的掩码，按模块名排序
+        self._module_masks = OrderedDict()
+        # 超级管理员分组id
+        self._root_group_ids = frozenset()
+        self._version = None
+        self._expire_at = 0
+        # 每次重建递增，用于判断基于旧位序号计算的掩码是否失效
+        self.generation = 0
+
+    def ensure(self, version, ttl):
+        """
+        版本号变动或超过有效期时重建注册表
+        """
+        if self._version == version and self._expire_at >= time.monotonic():
+            return self.generation
+        with self._lock:
+            if self._version != version or self._expire_at < time.monotonic():
+                self.build()
+                self._version = version
+                self._expire_at = time.monotonic() + ttl
+        return self.generation
+
+    def build(self):
+        permissions = (
+            db.session.query(
+                manager.permission_model.id,
+                manager.permission_model.module,
+                manager.permission_model.name,
+            )
+            .filter_by(soft=True, mount=True)
+            .order_by(manager.permission_model.module, manager.permission_model.id)
+            .all()
+        )
+        bits = dict()
+        id_to_bit = dict()
+        module_masks = OrderedDict()
+        for bit, (permission_id, module, name) in enumerate(permissions):
+            bits[(module, name)] = bit
+            id_to_bit[permission_id] = bit
+            module_masks[module] = module_masks.get(module, 0) | (1 << bit)
+
+        group_masks = dict()
+        group_permissions = db.session.query(
+            manager.group_permission_model.group_id,
+            manager.group_permission_model.permission_id,
+        ).all()
+        for group_id, permission_id in group_permissions:
+            bit = id_to_bit.get(permission_id)
+            if bit is not None:
+                group_masks[group_id] = group_masks.get(group_id, 0) | (1 << bit)
+
+        root_group_ids = db.session.query(manager.group_model.id).filter_by(
+            soft=True, level=GroupLevelEnum.ROOT.value
+        )
+
+        self._bits = bits
+        self._root_group_ids = frozenset(x[0] for x in root_group_ids.all())
+        self._permissions = [(module, name) for _, module, name in permissions]
+        self._group_masks = group_masks
+        self._module_masks = module_masks
+        self.generation += 1
+
+    def invalidate(self):
+        self._version = None
+
+    def mask_of(self, group_ids) -> int:
+        """
+        用户所属分组的权限掩码的并集
+        """
+        mask = 0
+        for group_id in group_ids:
+            mask |= self._group_masks.get(group_id, 0)
+        return mask
+
+    def is_admin(self, group_ids) -> bool:
+        return not self._root_group_ids.isdisjoint(group_ids)
+
+    def is_allowed(self, mask, endpoint) -> bool:
+        meta = manager.ep_meta.get(endpoint)
+        if meta is None:
+            return False
+        bit = self._bits.get((meta.module, meta.name))
+        if bit is None:
+            return False
+        return bool(mask >> bit & 1)
+
+    def permissions_of(self, mask) -> list:
+        """
+        按模块展开掩码，返回 [{module: [{"permission": name, "module": module}]}]
+        """
+        result = list()
+        for module, module_mask in self._module_masks.items():
+            owned = mask & module_mask
+            if not owned:
+                continue
+            items = list()
+            while owned:
+                low = owned & -owned
+                _, name = self._permissions[low.bit_length() - 1]
+                items.append({"permission": name, "module": module})
+                owned ^= low
+            result.append({module: items})
+        return result
+
+
+permission_registry = PermissionRegistry()
+
+
+@on_tables_changed(*WATCHED_TABLES)
+def _rebuild(tables):
+    from .cache import permission_cache
+
+    permission_cache.bump()
@@ -0,0 +1,76 @@
+"""
+    acl version of Lin
+    ~~~~~~~~~
+
+    所有 worker 共享的权限版本号：保存在 lin_acl_version 表的一行中，
+    分组、权限、用户分组关系变动时递增；签发令牌时写入 access token，
+    鉴权时与该版本号比较即可判断令牌中的分组信息是否过期
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+from lin.db import db
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import DatabaseError
+
+from app.model.lin.acl_version import AclVersion
+from app.util.common import insert_ignore
+
+# 版本号所在行的 id
+ROW_ID = 1
+
+
+class AclVersionStore(object):
+    def __init__(self):
+        self.table = AclVersion.__table__
+
+    def get(self):
+        """
+        当前的权限版本号，版本表尚未创建时返回 None
+        """
+        try:
+            with db.engine.connect() as conn:
+                version = conn.execute(self._select()).scalar()
+        except DatabaseError:
+            return None
+        return version or 0
+
+    def bump(self):
+        """
+        递增权限版本号，返回递增后的版本号，版本表尚未创建时返回 None
+        """
+        table = self.table
+        increase = (
+            table.update()
+            .where(table.c.id == ROW_ID)
+            .values(version=table.c.version + 1)
+        )
+        try:
+            with db.engine.begin() as conn:
+                if not conn.execute(increase).rowcount:
+                    # 版本号行不存在时插入，与其他 worker 同时插入时忽略冲突后再递增
+                    inserted = conn.execute(
+                        insert_ignore(table, conn.dialect.name).values(
+                            id=ROW_ID, version=1
+                        )
+                    ).rowcount
+                    if not inserted:
+                        conn.execute(increase)
+                return conn.execute(self._select()).scalar()
+        except DatabaseError:
+            return None
+
+    def create_table(self) -> list:
+        """
+        为已存在的数据库补建版本表，返回新建的表名
+        """
+        if self.table.name in inspect(db.engine).get_table_names():
+            return []
+        self.table.create(bind=db.engine)
+        return [self.table.name]
+
+    def _select(self):
+        return select([self.table.c.version]).where(self.table.c.id == ROW_ID)
+
+
+acl_version = AclVersionStore()
@@ -0,0 +1,222 @@
+"""
+    compiled json encoder of Lin
+    ~~~~~~~~~
+
+    编译式 JSON 序列化：为每个模型类按其列、_exclude 及动态追加的字段
+    生成一个序列化函数，序列化时不再逐行遍历 keys() 与 __getitem__；
+    输出直接为字节，编码后端为 orjson 或 simplejson，
+    simplejson 下的耗时并不优于 Lin 的 JSONEncoder，默认 MODE 仍为 lin，
+    安装 orjson 后再开启 compiled 模式；
+    日期、枚举、Decimal 等的输出格式与 Lin 的 JSONEncoder 保持一致
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import keyword
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+
+import simplejson
+from flask import current_app
+from lin.apidoc import BaseModel
+from lin.db import MixinJSONSerializer, Record, RecordCollection
+from lin.encoder import JSONEncoder
+from sqlalchemy import Date, DateTime
+from sqlalchemy import Enum as EnumType
+from sqlalchemy import inspect
+
+from app.extension.cache.lru import LRUCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MODE_LIN = "lin"
+MODE_COMPILED = "compiled"
+
+BACKEND_AUTO = "auto"
+BACKEND_ORJSON = "orjson"
+BACKEND_SIMPLEJSON = "simplejson"
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def _datetime(value):
+    return None if value is None else value.strftime(DATETIME_FORMAT)
+
+
+def _date(value):
+    return None if value is None else value.strftime(DATE_FORMAT)
+
+
+def _enum(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def _converter(column):
+    """
+    列类型对应的值转换函数，无需转换时为 None
+    """
+    if column is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return _datetime
+    if isinstance(column.type, Date):
+        return _date
+    if isinstance(column.type, EnumType):
+        return _enum
+    return None
+
+
+def compile_serializer(cls, fields):
+    """
+    为模型类及字段列表生成序列化函数：模型对象 -> dict
+    列字段按列类型在编译时确定转换函数，动态追加的字段原样输出，由编码器继续处理
+    """
+    columns = {column.name: column for column in inspect(cls).columns}
+    namespace = dict()
+    items = list()
+    for i, name in enumerate(fields):
+        if name.isidentifier() and not keyword.iskeyword(name):
+            getter = "o." + name
+        else:
+            namespace["_k%d" % i] = name
+            getter = "getattr(o, _k%d)" % i
+        convert = _converter(columns.get(name))
+        if convert is not None:
+            namespace["_c%d" % i] = convert
+            getter = "_c%d(%s)" % (i, getter)
+        items.append("%r: %s" % (name, getter))
+    source = "def serialize(o):\n    return {%s}\n" % ", ".join(items)
+    exec(compile(source, "<serializer %s>" % cls.__name__, "exec"), namespace)
+    return namespace["serialize"]
+
+
+class CompiledEncoder(object):
+    def __init__(self):
+        self.app = None
+        self.config = dict(MODE=MODE_LIN, BACKEND=BACKEND_AUTO)
+        # (模型类, 字段) -> 序列化函数，?fields= 的组合由客户端决定，需限制数量
+        self._serializers = LRUCache(size=256)
+        self._fallback = JSONEncoder()
+
+    def init_app(self, app):
+        self.app = app
+        self.config.update(app.config.get("JSON_ENCODER", dict()))
+        if self.config["MODE"] != MODE_COMPILED:
+            return
+        if self.config["BACKEND"] == BACKEND_ORJSON and orjson is None:
+            raise RuntimeError("JSON_ENCODER.BACKEND 为 orjson，但未安装 orjson")
+        # jsonify（异常、响应 schema 等）同样使用编译后的序列化函数
+        app.json_encoder = CompiledJSONEncoder
+        app.make_response = self._wrap(app.make_response)
+
+    @property
+    def backend(self):
+        if self.config["BACKEND"] == BACKEND_AUTO:
+            return BACKEND_ORJSON if orjson is not None else BACKEND_SIMPLEJSON
+        return self.config["BACKEND"]
+
+    def serializer_of(self, o):
+        """
+        模型对象对应的序列化函数，按 (类, 字段) 编译一次后复用
+        """
+        fields = tuple(o.keys())
+        key = (o.__class__, fields)
+        serializer = self._serializers.get(key)
+        if serializer is None:
+            serializer = compile_serializer(o.__class__, fields)
+            self._serializers.set(key, serializer)
+        return serializer
+
+    def default(self, o):
+        """
+        编码器无法直接处理的对象的转换规则，与 Lin 的 JSONEncoder 一致
+        """
+        if isinstance(o, MixinJSONSerializer):
+            return self.serializer_of(o)(o)
+        if isinstance(o, datetime):
+            return o.strftime(DATETIME_FORMAT)
+        if isinstance(o, date):
+            return o.strftime(DATE_FORMAT)
+        if isinstance(o, Decimal):
+            return _decimal(o)
+        if isinstance(o, (set, frozenset)):
+            return list(o)
+        return self._fallback.default(o)
+
+    def dumps(self, o, sort_keys=None, indent=False) -> bytes:
+        app = self.app or current_app
+        if sort_keys is None:
+            sort_keys = app.config["JSON_SORT_KEYS"]
+        if self.backend == BACKEND_ORJSON:
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(o, default=self.default, option=option)
+        return simplejson.dumps(
+            o,
+            default=self.default,
+            ensure_ascii=app.config["JSON_AS_ASCII"],
+            sort_keys=sort_keys,
+            use_decimal=True,
+            indent=2 if indent else None,
+            separators=(",", ": ") if indent else (",", ":"),
+        ).encode("utf-8")
+
+    def response(self, o):
+        app = self.app or current_app
+        indent = app.config["JSONIFY_PRETTYPRINT_REGULAR"] or app.debug
+        return app.response_class(
+            self.dumps(o, indent=indent) + b"\n",
+            mimetype=app.config["JSONIFY_MIMETYPE"],
+        )
+
+    def _wrap(self, make_response):
+        """
+        视图函数返回模型、列表、字典等对象时直接编码为字节，其余交给 Lin 处理
+        """
+
+        def make_compiled_response(rv):
+            if isinstance(rv, tuple) and rv and _jsonable(rv[0]):
+                rv = (self.response(rv[0]),) + rv[1:]
+            elif _jsonable(rv):
+                rv = self.response(rv)
+            return make_response(rv)
+
+        return make_compiled_response
+
+
+class CompiledJSONEncoder(JSONEncoder):
+    """
+    供 flask.jsonify 使用的编码器，模型对象使用编译后的序列化函数
+    """
+
+    def default(self, o):
+        if isinstance(o, MixinJSONSerializer):
+            return compiled_encoder.serializer_of(o)(o)
+        return super(CompiledJSONEncoder, self).default(o)
+
+
+def _decimal(o):
+    """
+    orjson 不支持 Decimal：与 Lin（simplejson use_decimal）一致按原样的数字输出，
+    不转为浮点数；orjson 版本低于 3.9 时没有 Fragment，退化为字符串
+    """
+    if orjson is not None and hasattr(orjson, "Fragment"):
+        return orjson.Fragment(str(o))
+    return str(o)
+
+
+def _jsonable(o):
+    return isinstance(
+        o, (RecordCollection, Record, BaseModel, int, list, set, Decimal, Enum)
+    ) or (hasattr(o, "keys") and hasattr(o, "__getitem__"))
+
+
+compiled_encoder = CompiledEncoder()
@@ -0,0 +1,236 @@
+"""
+    user importer of Lin
+    ~~~~~~~~~
+
+    批量导入用户：逐行按注册规则校验，用户名、邮箱按批查重，
+    密码按 PASSWORD_HASH 的 EXECUTOR 配置并行哈希，用户、身份、分组关联按批多行插入，
+    每批一个事务，返回逐行的导入结果
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import csv
+import io
+import json
+
+from lin import manager
+from lin.db import db
+from lin.exception import APIException, ParameterError
+from sqlalchemy import and_, select
+from sqlalchemy.exc import DatabaseError
+
+from app.extension.count.cache import count_cache
+from app.extension.password.hasher import password_hasher
+from app.extension.permission.groups import group_cache
+from app.validator.form import ImportUserForm
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+
+# CSV 中 group_ids 列的分隔符
+GROUP_SEPARATORS = (";", "|", " ")
+
+
+class UserImporter(object):
+    def __init__(self):
+        self.app = None
+        self.config = dict(CHUNK_SIZE=500, MAX_ROWS=10000)
+
+    def init_app(self, app):
+        self.app = app
+        self.config.update(app.config.get("USER_IMPORT", dict()))
+
+    def parse(self, text, fmt=FORMAT_CSV) -> list:
+        """
+        解析导入文件，返回 [(行号, 数据)]
+        csv 表头为 username,password,email,group_ids，多个分组id以 ; 分隔
+        """
+        if fmt not in (FORMAT_CSV, FORMAT_JSONL):
+            raise ParameterError("导入格式必须为 csv 或 jsonl")
+        if fmt == FORMAT_JSONL:
+            rows = list()
+            for line, raw in enumerate(text.splitlines(), start=1):
+                if not raw.strip():
+                    continue
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    data = None
+                rows.append((line, data if isinstance(data, dict) else None))
+            return rows
+        reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+        rows = list()
+        for data in reader:
+            data["group_ids"] = _split_group_ids(data.get("group_ids"))
+            # 表头占第 1 行
+            rows.append((reader.line_num, data))
+        return rows
+
+    def run(self, rows) -> dict:
+        """
+        导入用户，返回汇总及逐行结果
+        """
+        if len(rows) > self.config["MAX_ROWS"]:
+            raise ParameterError(
+                "单次最多导入 {max} 条".format(max=self.config["MAX_ROWS"])
+            )
+        results = dict()
+        valid = list()
+        usernames, emails = set(), set()
+        for line, data in rows:
+            form, message = self._validate(data)
+            if form is None:
+                results[line] = _result(line, data, message)
+            elif form.username.data in usernames:
+                results[line] = _result(line, data, "用户名重复，请重新输入")
+            elif form.email.data and form.email.data in emails:
+                results[line] = _result(line, data, "注册邮箱重复，请重新输入")
+            else:
+                usernames.add(form.username.data)
+                if form.email.data:
+                    emails.add(form.email.data)
+                valid.append((line, form))
+
+        size = self.config["CHUNK_SIZE"]
+        for i in range(0, len(valid), size):
+            for line, data, message in self._import_chunk(valid[i : i + size]):
+                results[line] = _result(line, data, message)
+        count_cache.invalidate(
+            manager.user_model.__tablename__, manager.user_group_model.__tablename__
+        )
+
+        items = [results[line] for line, _ in rows]
+        created = sum(1 for item in items if item["success"])
+        return dict(
+            total=len(items), created=created, failed=len(items) - created, items=items
+        )
+
+    @staticmethod
+    def _validate(data):
+        if data is None:
+            return None, "数据格式有误"
+        data = dict(data)
+        data.setdefault("confirm_password", data.get("password"))
+        group_ids = data.get("group_ids")
+        # 如果没传分组数据，则将其设定为 guest 分组
+        if not group_ids:
+            data["group_ids"] = [group_cache.guest_id]
+        elif not isinstance(group_ids, list) or not all(
+            type(gid) is int for gid in group_ids
+        ):
+            return None, "分组id必须为整数"
+        form = ImportUserForm(data)
+        try:
+            valid = form.validate()
+        except APIException as e:
+            return None, e.message
+        if not valid:
+            return None, form.errors
+        if form.email.data is not None and not form.email.data.strip():
+            form.email.data = None
+        return form, None
+
+    def _import_chunk(self, chunk):
+        """
+        导入一批通过校验的用户，逐行返回 (行号, 数据, 失败原因)
+        """
+        user_model = manager.user_model
+        forms = {form.username.data: (line, form) for line, form in chunk}
+        email_of = {f.email.data: u for u, (_, f) in forms.items() if f.email.data}
+        for username in self._existing(user_model.username, list(forms)):
+            line, form = forms.pop(username)
+            yield line, form.data, "用户名重复，请重新输入"
+        for email in self._existing(user_model.email, list(email_of)):
+            line, form = forms.pop(email_of[email], (None, None))
+            if line is not None:
+                yield line, form.data, "注册邮箱重复，请重新输入"
+        if not forms:
+            return
+
+        hashes = password_hasher.hash_many(f.password.data for _, f in forms.values())
+        try:
+            with db.engine.begin() as conn:
+                self._write(conn, forms, hashes)
+        except DatabaseError:
+            # 数据库错误的细节只写入运行日志，不返回给客户端
+            self.app.logger.exception("批量导入用户写入失败")
+            for line, form in forms.values():
+                yield line, form.data, "写入失败，请稍后重试"
+            return
+        for line, form in forms.values():
+            yield line, form.data, None
+
+    @staticmethod
+    def _existing(column, values) -> list:
+        if not values:
+            return []
+        model = manager.user_model
+        rows = db.session.query(column).filter(
+            column.in_(values), model.delete_time == None
+        )
+        return [value for value, in rows]
+
+    @staticmethod
+    def _write(conn, forms, hashes):
+        user_table = manager.user_model.__table__
+        conn.execute(
+            user_table.insert(),
+            [
+                dict(username=username, email=form.email.data)
+                for username, (_, form) in forms.items()
+            ],
+        )
+        # 多行插入无法通用地返回自增id，按用户名回查
+        ids = dict(
+            conn.execute(
+                select([user_table.c.username, user_table.c.id]).where(
+                    and_(
+                        user_table.c.username.in_(list(forms)),
+                        user_table.c.delete_time == None,
+                    )
+                )
+            ).fetchall()
+        )
+        conn.execute(
+            manager.identity_model.__table__.insert(),
+            [
+                dict(
+                    user_id=ids[username],
+                    identity_type="USERNAME_PASSWORD",
+                    identifier=username,
+                    credential=credential,
+                )
+                for username, credential in zip(forms, hashes)
+            ],
+        )
+        conn.execute(
+            manager.user_group_model.__table__.insert(),
+            [
+                dict(user_id=ids[username], group_id=group_id)
+                for username, (_, form) in forms.items()
+                for group_id in dict.fromkeys(form.group_ids.data)
+            ],
+        )
+
+
+def _split_group_ids(value):
+    if not value:
+        return []
+    for separator in GROUP_SEPARATORS:
+        value = value.replace(separator, ",")
+    try:
+        return [int(gid) for gid in value.split(",") if gid]
+    except ValueError:
+        return value
+
+
+def _result(line, data, message=None):
+    return dict(
+        line=line,
+        username=(data or dict()).get("username"),
+        success=message is None,
+        message=message or "用户创建成功",
+    )
+
+
+user_importer = UserImporter()
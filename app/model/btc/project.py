@@ -3,12 +3,18 @@
 """
 
 from lin.interface import InfoCrud as Base
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 
 from app.exception.api import BtcProjectNotFound
 
 
 class BtcProject(Base):
+    __table_args__ = (
+        Index("btc_project_update_time", "update_time"),
+        # 按排名的游标分页
+        Index("btc_project_rang_id", "rang", "id"),
+    )
+
     id = Column(Integer, primary_key=True, autoincrement=True)
     rang = Column(Integer)
     name = Column(String(50), nullable=False)
@@ -1,5 +1,9 @@
+from .acl_version import AclVersion
 from .group import Group
 from .group_permission import GroupPermission
+from .log import Log
+from .log_rollup import LogRollupDay, LogRollupHour
+from .log_username import LogUsername
 from .permission import Permission
 from .user import User
 from .user_group import UserGroup
@@ -0,0 +1,13 @@
+from lin.interface import BaseCrud
+from sqlalchemy import Column, Integer
+
+
+class AclVersion(BaseCrud):
+    """
+    所有 worker 共享的权限版本号，只有一行
+    """
+
+    __tablename__ = "lin_acl_version"
+
+    id = Column(Integer(), primary_key=True)
+    version = Column(Integer(), nullable=False, default=0, comment="权限版本号")
@@ -24,3 +24,10 @@ class Group(LinGroup):
         result = cls.query.filter_by(soft=True).filter(cls.id.in_(query))
         groups = result.all()
         return groups
+
+    @classmethod
+    def exists_any(cls) -> bool:
+        """
+        是否存在未删除的分组
+        """
+        return db.session.query(cls.query.filter_by(soft=True).exists()).scalar()
@@ -1,8 +1,62 @@
 from lin.model import GroupPermission as LinGroupPermission
 from lin.model import db, manager
+from sqlalchemy import Index
+
+from app.util.common import insert_ignore
 
 
 class GroupPermission(LinGroupPermission):
+    @classmethod
+    def dispatch(cls, group_id, permission_ids: list, commit=False) -> list:
+        """
+        为分组批量分配权限：一次查询已有的关联，一次插入缺少的关联，返回新增的权限id
+        """
+        permission_ids = list(dict.fromkeys(permission_ids))
+        if not permission_ids:
+            return permission_ids
+        existing = cls.select_permission_ids(group_id, permission_ids)
+        missing = [pid for pid in permission_ids if pid not in existing]
+        cls._insert(group_id, missing)
+        if commit:
+            db.session.commit()
+        return missing
+
+    @classmethod
+    def replace(cls, group_id, permission_ids: list, commit=False):
+        """
+        将分组的权限替换为 permission_ids，只增删有差异的关联，返回新增和删除的权限id
+        """
+        existing = cls.select_permission_ids(group_id)
+        permission_ids = list(dict.fromkeys(permission_ids))
+        removed = sorted(existing.difference(permission_ids))
+        added = [pid for pid in permission_ids if pid not in existing]
+        if removed:
+            cls.delete_batch_by_group_id_and_permission_ids(group_id, removed)
+        cls._insert(group_id, added)
+        if commit:
+            db.session.commit()
+        return added, removed
+
+    @classmethod
+    def select_permission_ids(cls, group_id, permission_ids=None) -> set:
+        query = db.session.query(cls.permission_id).filter(cls.group_id == group_id)
+        if permission_ids is not None:
+            query = query.filter(cls.permission_id.in_(permission_ids))
+        return {pid for pid, in query}
+
+    @classmethod
+    def _insert(cls, group_id, permission_ids):
+        if permission_ids:
+            # 单条多行 INSERT ... VALUES，而不是逐行执行的 executemany
+            db.session.execute(
+                insert_ignore(cls.__table__, db.engine.dialect.name).values(
+                    [
+                        dict(group_id=group_id, permission_id=pid)
+                        for pid in permission_ids
+                    ]
+                )
+            )
+
     @classmethod
     def delete_batch_by_group_id_and_permission_ids(
         cls, group_id, permission_ids: list, commit=False
@@ -12,3 +66,12 @@ class GroupPermission(LinGroupPermission):
         ).delete(synchronize_session=False)
         if commit:
             db.session.commit()
+
+
+# 分组与权限的关联唯一，批量分配时依赖该约束忽略并发插入的重复关联
+Index(
+    "group_permission_unique",
+    GroupPermission.group_id,
+    GroupPermission.permission_id,
+    unique=True,
+)
@@ -0,0 +1,5 @@
+from lin.logger import Log
+from sqlalchemy import Index
+
+# 日志按 (create_time, id) 游标分页
+Index("log_create_time_id", Log.create_time, Log.id)
@@ -0,0 +1,45 @@
+from lin.interface import BaseCrud
+from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint
+
+
+class LogRollupMixin(object):
+    """
+    行为日志按时间桶、人员、权限、路径、状态码汇总的次数
+    维度为空时记为空字符串 / 0，保证唯一约束生效
+    """
+
+    id = Column(Integer(), primary_key=True)
+    bucket = Column(DateTime(), nullable=False, comment="时间桶的起始时间")
+    username = Column(String(24), nullable=False, default="", comment="用户当时的昵称")
+    permission = Column(String(100), nullable=False, default="", comment="访问哪个权限")
+    path = Column(String(50), nullable=False, default="", comment="请求路径")
+    status_code = Column(Integer(), nullable=False, default=0, comment="请求的http返回码")
+    count = Column(Integer(), nullable=False, default=0, comment="次数")
+
+
+class LogRollupHour(LogRollupMixin, BaseCrud):
+    __tablename__ = "lin_log_rollup_hour"
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket",
+            "username",
+            "permission",
+            "path",
+            "status_code",
+            name="log_rollup_hour_key",
+        ),
+    )
+
+
+class LogRollupDay(LogRollupMixin, BaseCrud):
+    __tablename__ = "lin_log_rollup_day"
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket",
+            "username",
+            "permission",
+            "path",
+            "status_code",
+            name="log_rollup_day_key",
+        ),
+    )
@@ -0,0 +1,13 @@
+from lin.interface import BaseCrud
+from sqlalchemy import Column, Integer, String
+
+
+class LogUsername(BaseCrud):
+    """
+    记录过行为日志的用户名，随日志写入增量维护
+    """
+
+    __tablename__ = "lin_log_username"
+
+    id = Column(Integer(), primary_key=True)
+    username = Column(String(24), nullable=False, unique=True, comment="用户当时的昵称")
@@ -27,6 +27,30 @@ class Permission(LinPermission):
         permissions = result.all()
         return permissions
 
+    @classmethod
+    def select_by_group_ids_grouped(cls, group_ids: list) -> dict:
+        """
+        传入用户组Id列表 ，通过一次 Group-Permission 关联查询 获取 {用户组Id: 权限列表}
+        """
+        grouped = {group_id: list() for group_id in group_ids}
+        if not group_ids:
+            return grouped
+        group_permission = manager.group_permission_model
+        rows = (
+            db.session.query(group_permission.group_id, cls)
+            .join(cls, cls.id == group_permission.permission_id)
+            .filter(
+                group_permission.group_id.in_(group_ids),
+                cls.delete_time == None,
+                cls.mount == True,
+            )
+            .order_by(group_permission.group_id, cls.id)
+            .all()
+        )
+        for group_id, permission in rows:
+            grouped[group_id].append(permission)
+        return grouped
+
     @classmethod
     def select_by_group_ids_and_module(cls, group_ids: list, module) -> list:
         """
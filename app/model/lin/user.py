@@ -1,6 +1,12 @@
+from collections import defaultdict
+
+from lin.exception import NotFound, ParameterError, UnAuthentication
 from lin.model import User as LinUser
 from lin.model import db, func, manager
 
+from app.extension.password.hasher import password_hasher
+from app.extension.permission.groups import group_cache
+
 
 class User(LinUser):
     def _set_fields(self):
@@ -33,6 +39,107 @@ class User(LinUser):
         users = result.all()
         return users
 
+    @classmethod
+    def exists_by_group_id(cls, group_id) -> bool:
+        """ 分组下是否存在未删除的用户，编译为 EXISTS，不加载用户数据 """
+        query = db.session.query(manager.user_group_model.user_id).filter(
+            manager.user_group_model.group_id == group_id
+        )
+        result = cls.query.filter_by(soft=True).filter(cls.id.in_(query))
+        return db.session.query(result.exists()).scalar()
+
+    @classmethod
+    def exists_any(cls) -> bool:
+        """ 是否存在未删除的用户 """
+        return db.session.query(cls.query.filter_by(soft=True).exists()).scalar()
+
+    @classmethod
+    def select_page_with_groups(cls, start, count, group_id=None) -> list:
+        """
+        分页获取属于非 root 分组的用户，并补全其所属分组（不含 root 分组）
+        只查询用户与用户-分组关系两次，分组信息来自分组缓存
+        """
+        user_group = manager.user_group_model
+        users = (
+            cls.query.filter(cls.id.in_(cls._members_query(group_id)))
+            .order_by(cls.id)
+            .offset(start)
+            .limit(count)
+            .all()
+        )
+        if not users:
+            return users
+        relations = db.session.query(user_group.user_id, user_group.group_id).filter(
+            user_group.user_id.in_([user.id for user in users])
+        )
+        root_ids = group_cache.root_ids
+        if root_ids:
+            relations = relations.filter(~user_group.group_id.in_(root_ids))
+        group_ids = defaultdict(list)
+        for user_id, gid in relations.order_by(user_group.group_id):
+            group_ids[user_id].append(gid)
+        for user in users:
+            user.groups = group_cache.get_many(group_ids[user.id])
+            user._fields.append("groups")
+        return users
+
+    @classmethod
+    def count_with_groups(cls, group_id=None) -> int:
+        """
+        属于非 root 分组的用户数量
+        """
+        members = cls._members_query(group_id).distinct().subquery()
+        return db.session.query(func.count()).select_from(members).scalar()
+
+    @staticmethod
+    def _members_query(group_id=None):
+        user_group = manager.user_group_model
+        query = db.session.query(user_group.user_id)
+        root_ids = group_cache.root_ids
+        if root_ids:
+            query = query.filter(~user_group.group_id.in_(root_ids))
+        if group_id:
+            query = query.filter(user_group.group_id == group_id)
+        return query
+
+    @property
+    def password(self):
+        return manager.identity_model.get(user_id=self.id).credential
+
+    @password.setter
+    def password(self, raw):
+        credential = password_hasher.hash(raw)
+        user_identity = manager.identity_model.get(user_id=self.id)
+        if user_identity:
+            user_identity.credential = credential
+            user_identity.update(synchronize_session=False)
+        else:
+            user_identity = manager.identity_model()
+            user_identity.user_id = self.id
+            user_identity.identity_type = "USERNAME_PASSWORD"
+            user_identity.identifier = self.username
+            user_identity.credential = credential
+            db.session.add(user_identity)
+
+    def check_password(self, raw):
+        return password_hasher.verify(self.password, raw)
+
+    @classmethod
+    def verify(cls, username, password):
+        user = cls.query.filter_by(username=username).first()
+        if user is None or user.delete_time is not None:
+            raise NotFound("用户不存在")
+        credential = user.password
+        if not password_hasher.verify(credential, password):
+            raise ParameterError("密码错误，请输入正确密码")
+        if not user.is_active:
+            raise UnAuthentication("您目前处于未激活状态，请联系超级管理员")
+        # 哈希方案或成本参数已调整，登录成功时按新配置重新哈希
+        if password_hasher.needs_rehash(credential):
+            with db.auto_commit():
+                user.password = password
+        return user
+
     def reset_password(self, new_password):
         self.password = new_password
 
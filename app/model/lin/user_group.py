@@ -3,6 +3,36 @@ from lin.model import db, manager
 
 
 class UserGroup(LinUserGroup):
+    @classmethod
+    def sync(cls, user_id, group_ids: list, commit=False):
+        """
+        将用户的分组同步为 group_ids，只增删有差异的关联，返回新增和删除的分组id
+        """
+        existing = {
+            gid
+            for gid, in db.session.query(cls.group_id).filter(cls.user_id == user_id)
+        }
+        group_ids = list(dict.fromkeys(group_ids))
+        removed = sorted(existing.difference(group_ids))
+        added = [gid for gid in group_ids if gid not in existing]
+        if removed:
+            cls.delete_batch_by_user_id_and_group_ids(user_id, removed)
+        for group_id in added:
+            user_group = cls()
+            user_group.user_id = user_id
+            user_group.group_id = group_id
+            db.session.add(user_group)
+        if commit:
+            db.session.commit()
+        return added, removed
+
+    @classmethod
+    def exists_any(cls) -> bool:
+        """
+        是否存在用户-分组关联
+        """
+        return db.session.query(cls.query.exists()).scalar()
+
     @classmethod
     def delete_batch_by_user_id_and_group_ids(
         cls, user_id, group_ids: list, commit=False
@@ -4,12 +4,14 @@
 """
 
 from lin.interface import InfoCrud as Base
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 
 from app.exception.api import BookNotFound
 
 
 class Book(Base):
+    __table_args__ = (Index("book_update_time", "update_time"),)
+
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(50), nullable=False)
     author = Column(String(30), default="未名")
@@ -1,7 +1,9 @@
 from flask import jsonify
 from lin.redprint import Redprint
 
+from app.extension.cache.conditional import conditional, table_version
 from app.plugin.poem.app.form import PoemListForm, PoemSearchForm
+from app.util.fields import get_fields_from_query
 
 from .model import Poem
 
@@ -9,20 +11,22 @@ api = Redprint("poem")
 
 
 @api.route("/all")
+@conditional(table_version(Poem))
 def get_list():
     form = PoemListForm().validate_for_api()
-    poems = Poem().get_all(form)
+    poems = Poem().get_all(form, get_fields_from_query(Poem))
     return jsonify(poems)
 
 
 @api.route("/search")
 def search():
     form = PoemSearchForm().validate_for_api()
-    poems = Poem().search(form.q.data)
+    poems = Poem().search(form.q.data, get_fields_from_query(Poem))
     return jsonify(poems)
 
 
 @api.route("/authors")
+@conditional(table_version(Poem))
 def get_authors():
     authors = Poem.get_authors()
     return jsonify(authors)
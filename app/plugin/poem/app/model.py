@@ -2,11 +2,15 @@ from lin.config import lin_config
 from lin.db import db
 from lin.exception import NotFound
 from lin.interface import InfoCrud as Base
-from sqlalchemy import Column, Integer, String, Text, text
+from sqlalchemy import Column, Index, Integer, String, Text, text
+
+from app.util.fields import load_fields, select_fields
 
 
 class Poem(Base):
     __tablename__ = "lin_poem"
+    __table_args__ = (Index("poem_update_time", "update_time"),)
+
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(50), nullable=False, comment="标题")
     author = Column(String(50), default="未名", comment="作者")
@@ -24,8 +28,8 @@ class Poem(Base):
             ret.append(x.split("/"))
         return ret
 
-    def get_all(self, form):
-        query = self.query.filter_by(delete_time=None)
+    def get_all(self, form, fields=None):
+        query = load_fields(self.query, Poem, fields).filter_by(delete_time=None)
 
         if form.author.data:
             query = query.filter_by(author=form.author.data)
@@ -38,13 +42,14 @@ class Poem(Base):
 
         if not poems:
             raise NotFound("没有找到相关诗词")
-        return poems
+        return select_fields(poems, fields)
 
-    def search(self, q):
-        poems = self.query.filter(Poem.title.like("%" + q + "%")).all()
+    def search(self, q, fields=None):
+        query = load_fields(self.query, Poem, fields)
+        poems = query.filter(Poem.title.like("%" + q + "%")).all()
         if not poems:
             raise NotFound("没有找到相关诗词")
-        return poems
+        return select_fields(poems, fields)
 
     @classmethod
     def get_authors(cls):
@@ -9,3 +9,18 @@ def split_group(dict_list, key):
     for key, group in tmps:
         result.append({key: list(group)})
     return result
+
+
+def insert_ignore(table, dialect):
+    """
+    忽略唯一约束冲突的 INSERT 语句
+    """
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+
+        return insert(table).on_conflict_do_nothing()
+    return (
+        table.insert()
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
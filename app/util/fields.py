@@ -0,0 +1,71 @@
+from flask import request
+from sqlalchemy import inspect
+from sqlalchemy.orm import Load
+
+
+def serializable_fields(model) -> list:
+    """
+    模型默认输出的字段：所有列去掉 _set_fields 中排除的字段，按列的定义顺序
+    """
+    prototype = model.__new__(model)
+    prototype._fields = []
+    prototype._exclude = []
+    prototype._set_fields()
+    return [
+        column.name
+        for column in inspect(model).columns
+        if column.name not in prototype._exclude
+    ]
+
+
+def get_fields_from_query(model):
+    """
+    解析 ?fields= / ?exclude=（逗号分隔），返回需要输出的字段，均未传入时返回 None
+    """
+    from lin.exception import ParameterError
+
+    fields, exclude = request.args.get("fields"), request.args.get("exclude")
+    if not fields and not exclude:
+        return None
+    available = serializable_fields(model)
+    selected = set(available)
+    for name, value in (("fields", fields), ("exclude", exclude)):
+        names = {f.strip() for f in (value or "").split(",") if f.strip()}
+        unknown = names.difference(available)
+        if unknown:
+            raise ParameterError(
+                "{name} 参数有误，不存在字段：{fields}".format(
+                    name=name, fields=",".join(sorted(unknown))
+                )
+            )
+        if name == "fields" and names:
+            selected = names
+        elif name == "exclude":
+            selected -= names
+    # 按列的定义顺序输出，字段顺序不同的请求共用同一序列化函数
+    return [f for f in available if f in selected]
+
+
+def load_fields(query, model, fields):
+    """
+    只从数据库加载需要输出的列：fields 为 None 时不做处理，
+    否则其余列通过 load_only 延迟加载，不会被查询
+    """
+    if fields is None:
+        return query
+    # 字段名为列名，列名与属性名不同时（如 Poem 的 content）需转换为属性名
+    attrs = {
+        prop.columns[0].name: prop.key for prop in inspect(model).column_attrs
+    }
+    return query.options(Load(model).load_only(*(attrs[f] for f in fields)))
+
+
+def select_fields(items, fields):
+    """
+    只输出需要的字段，避免序列化时访问延迟加载的列
+    """
+    if fields is None:
+        return items
+    for item in items if isinstance(items, list) else [items]:
+        item._fields = list(fields)
+    return items
@@ -1,4 +1,10 @@
+import base64
+import json
+import math
+from datetime import datetime
+
 from flask import current_app, request
+from sqlalchemy import DateTime, and_, or_
 
 
 def get_count_from_query():
@@ -37,3 +43,174 @@ def paginate():
     if start < 0 or count < 0:
         raise ParameterError()
     return start, count
+
+
+def encode_cursor(values, backward=False, phase=0):
+    """
+    将排序键的值编码为不透明的游标字符串，phase 为分段分页时游标所在的段
+    """
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    data = {"v": payload, "b": backward}
+    if phase:
+        data["p"] = phase
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    """
+    解析游标，返回排序键的值、是否向前翻页和游标所在的段
+    """
+    from lin.exception import ParameterError
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw.decode("utf-8"))
+        if len(data["v"]) != len(columns):
+            raise ValueError()
+        values = [
+            datetime.fromisoformat(v)
+            if v is not None and isinstance(c.type, DateTime)
+            else v
+            for c, v in zip(columns, data["v"])
+        ]
+        return values, bool(data.get("b")), int(data.get("p", 0))
+    except (ValueError, TypeError, KeyError):
+        raise ParameterError("cursor 参数有误")
+
+
+def keyset_paginate(
+    query, columns, cursor=None, count=10, offset=0, desc=True, nullable=False
+):
+    """
+    基于排序键 columns 的游标分页，翻页成本与页码无关
+    传入 cursor 时按游标定位，否则按 offset 定位（兼容页码分页）
+    nullable 为 True 时首个排序键可能为 NULL，分两段查询，每段都可以走索引：
+    先按 columns 取首列非 NULL 的行，再按其余排序键取首列为 NULL 的行，游标中记录所在的段
+    :return: 本页数据，下一页游标，上一页游标
+    """
+    values, backward, phase = (
+        decode_cursor(cursor, columns) if cursor else (None, False, 0)
+    )
+    if nullable:
+        items = _fetch_phases(
+            query, columns, values, backward, phase, count + 1, offset, desc
+        )
+    else:
+        # 向前翻页时反转排序方向，取到数据后再翻转回来
+        items = _fetch(query, columns, values, desc != backward, count + 1, offset)
+    has_more = len(items) > count
+    items = items[:count]
+    if backward:
+        items.reverse()
+    if not items:
+        return items, None, None
+
+    def cursor_of(item, backward=False):
+        key = [getattr(item, c.key) for c in columns]
+        return encode_cursor(key, backward, int(nullable and key[0] is None))
+
+    has_next = has_more if not backward else True
+    has_prev = has_more if backward else (values is not None or offset > 0)
+    next_cursor = cursor_of(items[-1]) if has_next else None
+    prev_cursor = cursor_of(items[0], backward=True) if has_prev else None
+    return items, next_cursor, prev_cursor
+
+
+def keyset_window(statement, columns, cursor=None, count=10, offset=0, desc=True):
+    """
+    将游标定位、排序及本页最多用到的行数应用到 Core 查询 statement 上，
+    用于合并查询（UNION ALL）的每个分支，各分支按索引只读取本页可能用到的行，
+    外层再以相同的 cursor、count、offset 调用 keyset_paginate
+    """
+    values, backward, _ = (
+        decode_cursor(cursor, columns) if cursor else (None, False, 0)
+    )
+    descending = desc != backward
+    if values is not None:
+        statement = statement.where(seek(columns, values, descending))
+    else:
+        count += offset
+    order = [c.desc() if descending else c.asc() for c in columns]
+    return statement.order_by(*order).limit(count + 1)
+
+
+def keyset_page(query, columns, total, desc=False, nullable=False):
+    """
+    按排序键 columns 分页：传入 cursor 时按游标定位，否则按 page、count 定位
+    返回分页接口的结构，并附带下一页、上一页游标；按游标翻页时页码无意义，不返回 page
+    """
+    start, count = paginate()
+    cursor = request.args.get("cursor")
+    items, next_cursor, prev_cursor = keyset_paginate(
+        query, columns, cursor, count, offset=start, desc=desc, nullable=nullable
+    )
+    page = {
+        "count": count,
+        "items": items,
+        "total": total,
+        "total_page": math.ceil(total / count) if count else 0,
+        "next": next_cursor,
+        "prev": prev_cursor,
+    }
+    if not cursor:
+        page["page"] = get_page_from_query()
+    return page
+
+
+def seek(columns, values, descending):
+    """
+    定位到排序键 columns 的 values 之后，descending 可按列分别指定
+    """
+    if not isinstance(descending, (list, tuple)):
+        descending = [descending] * len(columns)
+    # (c1, c2) < (v1, v2) 展开为 c1 < v1 or (c1 = v1 and c2 < v2)，兼容不支持行值比较的数据库
+    column, value = columns[0], values[0]
+    after = column < value if descending[0] else column > value
+    if len(columns) == 1:
+        return after
+    rest = seek(columns[1:], values[1:], descending[1:])
+    return or_(after, and_(column == value, rest))
+
+
+def _fetch(query, columns, values, descending, limit, offset=0):
+    """
+    从游标 values 之后（无游标时从 offset 处）按 columns 取最多 limit 条数据
+    """
+    if values is not None:
+        query = query.filter(seek(columns, values, descending))
+    query = query.order_by(*(c.desc() if descending else c.asc() for c in columns))
+    if values is None and offset:
+        query = query.offset(offset)
+    return query.limit(limit).all()
+
+
+def _fetch_phases(query, columns, values, backward, phase, limit, offset, desc):
+    """
+    分两段取数据：第 0 段为首个排序键非 NULL 的行，按 columns 排序；
+    第 1 段为其为 NULL 的行，按其余排序键排序。向后翻页时第 0 段取完再取第 1 段，
+    向前翻页时反之，游标只对所在的段生效，之后的段从头开始
+    """
+    lead = columns[0]
+    phases = [
+        (query.filter(lead != None), columns),
+        (query.filter(lead == None), columns[1:]),
+    ]
+    order = [1, 0] if backward else [0, 1]
+    order = order[order.index(phase) :]
+    if values is not None:
+        offset = 0
+    items = list()
+    for n, i in enumerate(order):
+        q, keys = phases[i]
+        after = None
+        if n == 0 and values is not None:
+            after = values[len(columns) - len(keys) :]
+        elif n > 0 and offset:
+            # 按页码定位且第 0 段不足 offset 条时，扣除第 0 段的行数
+            offset = 0 if items else max(offset - phases[0][0].count(), 0)
+        limit_left = limit - len(items)
+        items.extend(_fetch(q, keys, after, desc != backward, limit_left, offset))
+        if len(items) >= limit:
+            break
+    return items
@@ -9,8 +9,11 @@ from lin import manager
 from lin.exception import ParameterError
 from lin.form import Form
 from wtforms import DateTimeField, FieldList, IntegerField, PasswordField, StringField
+from wtforms import Form as WTForm
 from wtforms.validators import DataRequired, EqualTo, NumberRange, Regexp, length
 
+from app.extension.permission.groups import group_cache
+
 # 注册校验
 
 
@@ -60,6 +63,19 @@ class RegisterForm(EmailForm):
                 raise ParameterError("分组不存在")
 
 
+# 批量导入用户时逐行校验，规则与注册一致
+class ImportUserForm(RegisterForm):
+    def __init__(self, data):
+        # 数据来自导入文件而非请求，lin 的 Form 构造时会读取请求数据，
+        # 命令行导入时也没有请求上下文，因此直接使用 wtforms 的构造
+        WTForm.__init__(self, data=data)
+
+    def validate_group_ids(self, value):
+        for group_id in value.data:
+            if group_cache.get(group_id) is None:
+                raise ParameterError("分组不存在")
+
+
 # 登录校验
 
 
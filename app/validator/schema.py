@@ -22,13 +22,11 @@ class UsernameListSchema(BaseModel):
     items: List[str]
 
 
-class LogQuerySearchSchema(BaseModel):
+class LogFilterSchema(BaseModel):
     keyword: Optional[str] = None
     name: Optional[str] = None
     start: Optional[str] = Field(None, description="YY-MM-DD HH:MM:SS")
     end: Optional[str] = Field(None, description="YY-MM-DD HH:MM:SS")
-    count: int = Field(5, gt=0, lt=16, description="0 < count < 16")
-    page: int = 0
 
     @validator("start", "end")
     def datetime_match(cls, v, values, **kwargs):
@@ -36,11 +34,72 @@ class LogQuerySearchSchema(BaseModel):
             return v
         raise ValueError("时间格式有误")
 
+
+class LogQuerySearchSchema(LogFilterSchema):
+    count: int = Field(5, gt=0, lt=16, description="0 < count < 16")
+    page: int = 0
+    cursor: Optional[str] = Field(None, description="翻页游标，传入时忽略page")
+    with_total: bool = Field(True, description="是否统计总数")
+
     @staticmethod
     def offset_handler(req, resp, req_validation_error, instance):
         g.offset = req.context.query.count * req.context.query.page
 
 
+class LogExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class LogExportSchema(LogFilterSchema):
+    format: LogExportFormat = LogExportFormat.csv
+    # 断点续传：传入已导出的最后一条日志的 create_time 与 id
+    after_time: Optional[datetime] = Field(None, description="YY-MM-DD HH:MM:SS.ffffff")
+    after_id: Optional[int] = None
+
+
+class LogGranularity(str, Enum):
+    hour = "hour"
+    day = "day"
+
+
+class LogAnalyticsQuerySchema(BaseModel):
+    granularity: LogGranularity = LogGranularity.hour
+    start: Optional[str] = Field(None, description="YY-MM-DD HH:MM:SS")
+    end: Optional[str] = Field(None, description="YY-MM-DD HH:MM:SS")
+    group_by: Optional[str] = Field(
+        None, description="细分维度，逗号分隔：username,permission,path,status_code"
+    )
+
+    @validator("start", "end")
+    def datetime_match(cls, v, values, **kwargs):
+        if re.match(datetime_regex, v):
+            return v
+        raise ValueError("时间格式有误")
+
+    @validator("group_by")
+    def dimensions_match(cls, v, values, **kwargs):
+        dimensions = [d.strip() for d in v.split(",") if d.strip()]
+        allowed = ("username", "permission", "path", "status_code")
+        if any(d not in allowed for d in dimensions):
+            raise ValueError("细分维度有误")
+        return ",".join(dict.fromkeys(dimensions))
+
+
+class LogBucketSchema(BaseModel):
+    time: datetime
+    count: int
+    username: Optional[str]
+    permission: Optional[str]
+    path: Optional[str]
+    status_code: Optional[int]
+
+
+class LogAnalyticsSchema(BaseModel):
+    granularity: LogGranularity
+    items: List[LogBucketSchema]
+
+
 class LogSchema(BaseModel):
     id: int
     message: str
@@ -62,6 +121,10 @@ class BasePageSchema(BaseModel):
 
 
 class LogPageSchema(BasePageSchema):
+    total: Optional[int]
+    total_page: Optional[int]
+    next: Optional[str] = Field(None, description="下一页游标")
+    prev: Optional[str] = Field(None, description="上一页游标")
     items: List[LogSchema]
 
 
@@ -0,0 +1,106 @@
+"""
+    JSON 序列化基准：比较 Lin 的 JSONEncoder 与编译式序列化在 10k 行数据上的耗时
+
+    python -m tests.benchmark_encoder [行数] [重复次数]
+
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import json
+import sys
+import time
+from datetime import datetime
+
+from flask import json as flask_json
+from lin.encoder import JSONEncoder
+
+from app.extension.serializer.encoder import (
+    BACKEND_ORJSON,
+    BACKEND_SIMPLEJSON,
+    compiled_encoder,
+    orjson,
+)
+from app.model.lin import User
+from app.model.v1.book import Book
+
+from . import app
+
+
+def make(cls, **attrs):
+    """
+    构造与查询结果相同的模型对象
+    """
+    obj = cls()
+    for key, value in attrs.items():
+        setattr(obj, key, value)
+    obj.init_on_load()
+    return obj
+
+
+def make_books(n):
+    now = datetime.now()
+    return [
+        make(
+            Book,
+            id=i,
+            title="book %d" % i,
+            author="作者 %d" % i,
+            summary="summary " * 20,
+            image="https://img.example.com/%d.png" % i,
+            create_time=now,
+            update_time=now,
+        )
+        for i in range(n)
+    ]
+
+
+def make_users(n):
+    users = list()
+    for i in range(n):
+        user = make(User, id=i, username="user%d" % i, nickname="用户%d" % i)
+        user.groups = [{"id": 2, "name": "Guest", "info": "游客组", "level": 3}]
+        user._fields.append("groups")
+        users.append(user)
+    return users
+
+
+def measure(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(rows=10000, repeat=5):
+    payloads = {
+        "books": make_books(rows),
+        "users": dict(
+            count=rows, page=0, total=rows, total_page=1, items=make_users(rows)
+        ),
+    }
+    backends = [BACKEND_SIMPLEJSON] + ([BACKEND_ORJSON] if orjson else [])
+    print("rows={rows} repeat={repeat} (best of)".format(rows=rows, repeat=repeat))
+    for name, payload in payloads.items():
+        lin = measure(lambda: flask_json.dumps(payload, cls=JSONEncoder), repeat)
+        print("{name:<6} lin        {ms:8.1f} ms".format(name=name, ms=lin * 1000))
+        expected = json.loads(flask_json.dumps(payload, cls=JSONEncoder))
+        for backend in backends:
+            compiled_encoder.config["BACKEND"] = backend
+            assert json.loads(compiled_encoder.dumps(payload)) == expected
+            elapsed = measure(lambda: compiled_encoder.dumps(payload), repeat)
+            print(
+                "{name:<6} {backend:<10} {ms:8.1f} ms  x{speedup:.1f}".format(
+                    name=name,
+                    backend=backend,
+                    ms=elapsed * 1000,
+                    speedup=lin / elapsed,
+                )
+            )
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        main(*(int(arg) for arg in sys.argv[1:3]))
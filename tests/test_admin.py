@@ -2,6 +2,16 @@
     :copyright: © 2020 by the Lin team.
     :license: MIT, see LICENSE for more details.
 """
+import lin
+from lin.db import db
+from sqlalchemy import func, select
+from sqlalchemy.exc import DatabaseError
+
+from app.cli.db.index import index
+from app.extension.permission.version import acl_version
+from app.extension.user.importer import UserImporter
+from app.model.lin import GroupPermission, User
+
 from . import app, fixtureFunc, get_token
 
 
@@ -12,6 +22,31 @@ def test_permission(fixtureFunc):
             headers={"Authorization": "Bearer " + get_token()},
         )
         assert rv.status_code == 200
+        assert rv.get_json() and rv.headers["ETag"]
+        rv = c.get(
+            "/cms/admin/permission",
+            headers={
+                "Authorization": "Bearer " + get_token(),
+                "If-None-Match": rv.headers["ETag"],
+            },
+        )
+        assert rv.status_code == 304 and not rv.data
+
+
+def test_get_cache_stats(fixtureFunc):
+    with app.test_client() as c:
+        for _ in range(2):
+            c.get("/btc/project?count=1&stats=1")
+        rv = c.get(
+            "/cms/admin/cache/stats",
+            headers={"Authorization": "Bearer " + get_token()},
+        )
+        assert rv.status_code == 200
+        stats = rv.get_json()
+        assert stats["entries"] >= 1 and stats["hits"] >= 1
+        projects = [v for k, v in stats["endpoints"].items() if "get_projects" in k]
+        assert projects and projects[0]["HIT"] >= 1 and projects[0]["MISS"] >= 1
+        assert c.get("/cms/admin/cache/stats").status_code == 401
 
 
 def test_get_root_users(fixtureFunc):
@@ -20,3 +55,322 @@ def test_get_root_users(fixtureFunc):
             "/cms/admin/users", headers={"Authorization": "Bearer " + get_token()}
         )
         assert rv.status_code == 200
+
+
+def test_get_users_with_groups(fixtureFunc):
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        c.post(
+            "/cms/admin/group",
+            headers=headers,
+            json={"name": "editor", "info": "编辑", "permission_ids": []},
+        )
+        groups = c.get("/cms/admin/group/all", headers=headers).get_json()
+        gid = [g["id"] for g in groups if g["name"] == "editor"][0]
+        c.post(
+            "/cms/user/register",
+            headers=headers,
+            json={
+                "username": "editor",
+                "password": "123456",
+                "confirm_password": "123456",
+                "group_ids": [gid],
+            },
+        )
+        for query in ("", "?group_id={gid}".format(gid=gid)):
+            rv = c.get("/cms/admin/users" + query, headers=headers)
+            users = rv.get_json()["items"]
+            editor = [u for u in users if u["username"] == "editor"][0]
+            assert [g["name"] for g in editor["groups"]] == ["editor"]
+            assert rv.get_json()["total"] == len(users)
+
+
+def test_get_admin_groups_with_permissions(fixtureFunc):
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        rv = c.get("/cms/admin/permission", headers=headers).get_json()
+        permission_ids = [p["id"] for ps in rv.values() for p in ps][:2]
+        c.post(
+            "/cms/admin/group",
+            headers=headers,
+            json={"name": "viewer", "info": "查看", "permission_ids": permission_ids},
+        )
+        groups = c.get("/cms/admin/group?count=15", headers=headers).get_json()
+        viewer = [g for g in groups["items"] if g["name"] == "viewer"][0]
+        assert sorted(p["id"] for p in viewer["permissions"]) == sorted(permission_ids)
+        group = c.get(
+            "/cms/admin/group/{id}".format(id=viewer["id"]), headers=headers
+        ).get_json()
+        assert group["permissions"] == viewer["permissions"]
+
+
+def test_replace_auths(fixtureFunc):
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        rv = c.get("/cms/admin/permission", headers=headers).get_json()
+        a, b, d = [p["id"] for ps in rv.values() for p in ps][:3]
+        c.post(
+            "/cms/admin/group",
+            headers=headers,
+            json={"name": "auditor", "info": "审计", "permission_ids": [a, b, b]},
+        )
+        groups = c.get("/cms/admin/group/all", headers=headers).get_json()
+        gid = [g["id"] for g in groups if g["name"] == "auditor"][0]
+        c.post(
+            "/cms/admin/permission/dispatch/batch",
+            headers=headers,
+            json={"group_id": gid, "permission_ids": [b, d]},
+        )
+        rv = c.post(
+            "/cms/admin/permission/replace",
+            headers=headers,
+            json={"group_id": gid, "permission_ids": [b, d]},
+        )
+        assert rv.status_code == 200
+        group = c.get("/cms/admin/group/{gid}".format(gid=gid), headers=headers)
+        assert [p["id"] for p in group.get_json()["permissions"]] == sorted([b, d])
+
+
+def test_index_dedupes_group_permission(fixtureFunc):
+    table = GroupPermission.__table__
+    unique = [i for i in table.indexes if i.name == "group_permission_unique"][0]
+    with app.app_context():
+        unique.drop(bind=db.engine)
+        with db.engine.begin() as conn:
+            columns = [table.c.group_id, table.c.permission_id]
+            row = conn.execute(select(columns)).first()
+            conn.execute(table.insert(), [dict(row), dict(row)])
+        assert "group_permission_unique" in index()
+        with db.engine.connect() as conn:
+            duplicated = conn.execute(
+                select([func.count()])
+                .select_from(table)
+                .group_by(table.c.group_id, table.c.permission_id)
+                .having(func.count() > 1)
+            ).fetchall()
+        assert duplicated == []
+
+
+def test_update_user_groups(fixtureFunc):
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        c.post(
+            "/cms/user/register",
+            headers=headers,
+            json={
+                "username": "member",
+                "password": "123456",
+                "confirm_password": "123456",
+            },
+        )
+        users = c.get("/cms/admin/users?count=15", headers=headers).get_json()
+        member = [u for u in users["items"] if u["username"] == "member"][0]
+        assert [g["name"] for g in member["groups"]] == ["Guest"]
+        groups = c.get("/cms/admin/group/all", headers=headers).get_json()
+        gids = [g["id"] for g in groups]
+        for group_ids in (gids, gids[:1], []):
+            rv = c.put(
+                "/cms/admin/user/{id}".format(id=member["id"]),
+                headers=headers,
+                json={"group_ids": group_ids, "email": "member@example.com"},
+            )
+            assert rv.status_code == 200
+            users = c.get("/cms/admin/users?count=15", headers=headers).get_json()
+            member = [u for u in users["items"] if u["username"] == "member"][0]
+            expected = group_ids or [g["id"] for g in groups if g["name"] == "Guest"]
+            assert sorted(g["id"] for g in member["groups"]) == sorted(expected)
+
+
+def test_import_users(fixtureFunc):
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        body = "\n".join(
+            [
+                "username,password,email,group_ids",
+                "alice,123456,alice@example.com,",
+                "bob,123456,,2;999",
+                "alice,123456,,",
+                "root,123456,,",
+                "carol,123,,",
+            ]
+        )
+        rv = c.post(
+            "/cms/admin/users/batch",
+            headers={**headers, "Content-Type": "text/csv"},
+            data=body,
+        )
+        assert rv.status_code == 200
+        report = rv.get_json()
+        assert report["total"] == 5 and report["created"] == 1
+        assert [i["line"] for i in report["items"]] == [2, 3, 4, 5, 6]
+        assert [i["success"] for i in report["items"]] == [
+            True,
+            False,
+            False,
+            False,
+            False,
+        ]
+        rv = c.post(
+            "/cms/user/login", json={"username": "alice", "password": "123456"}
+        )
+        assert rv.status_code == 200
+
+
+def test_import_users_hides_database_error(fixtureFunc, monkeypatch):
+    def fail(conn, forms, hashes):
+        raise DatabaseError("INSERT", {}, Exception("secret detail"))
+
+    monkeypatch.setattr(UserImporter, "_write", staticmethod(fail))
+    with app.test_client() as c:
+        rv = c.post(
+            "/cms/admin/users/batch",
+            headers={
+                "Authorization": "Bearer " + get_token(),
+                "Content-Type": "text/csv",
+            },
+            data="username,password,email,group_ids\ndave,123456,,",
+        )
+        assert rv.status_code == 200
+        item = rv.get_json()["items"][0]
+        assert not item["success"] and item["message"] == "写入失败，请稍后重试"
+
+
+def test_delete_group_with_users(fixtureFunc):
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        permissions = c.get("/cms/admin/permission", headers=headers).get_json()
+        pid = [p["id"] for ps in permissions.values() for p in ps][0]
+        rv = c.post(
+            "/cms/admin/group",
+            headers=headers,
+            json={"name": "reviewer", "info": "审核", "permission_ids": [pid]},
+        )
+        assert rv.status_code == 200
+        groups = c.get("/cms/admin/group/all", headers=headers).get_json()
+        gid = [g["id"] for g in groups if g["name"] == "reviewer"][0]
+        c.post(
+            "/cms/user/register",
+            headers=headers,
+            json={
+                "username": "reviewer",
+                "password": "123456",
+                "confirm_password": "123456",
+                "group_ids": [gid],
+            },
+        )
+        rv = c.delete("/cms/admin/group/{id}".format(id=gid), headers=headers)
+        assert rv.status_code == 401
+        users = c.get(
+            "/cms/admin/users?group_id={id}".format(id=gid), headers=headers
+        ).get_json()
+        for user in users["items"]:
+            c.delete("/cms/admin/user/{id}".format(id=user["id"]), headers=headers)
+        rv = c.delete("/cms/admin/group/{id}".format(id=gid), headers=headers)
+        assert rv.status_code == 200
+
+
+def test_group_required_revoked_and_inactive(fixtureFunc, monkeypatch):
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        rv = c.get("/cms/admin/permission", headers=headers).get_json()
+        permission_id = [p["id"] for p in rv["日志"] if p["name"] == "查询日志"][0]
+        c.post(
+            "/cms/admin/group",
+            headers=headers,
+            json={"name": "inspector", "info": "巡检", "permission_ids": [permission_id]},
+        )
+        groups = c.get("/cms/admin/group/all", headers=headers).get_json()
+        gid = [g["id"] for g in groups if g["name"] == "inspector"][0]
+        c.post(
+            "/cms/user/register",
+            headers=headers,
+            json={
+                "username": "inspector",
+                "password": "123456",
+                "confirm_password": "123456",
+                "group_ids": [gid],
+            },
+        )
+        rv = c.post(
+            "/cms/user/login", json={"username": "inspector", "password": "123456"}
+        )
+        inspector = {"Authorization": "Bearer " + rv.get_json()["access_token"]}
+        assert c.get("/cms/log", headers=inspector).status_code == 200
+        assert c.get("/cms/admin/users", headers=inspector).status_code == 401
+
+        # 停用的用户即使令牌未过期也无法访问
+        monkeypatch.setattr(
+            User, "is_active", property(lambda self: self.username != "inspector")
+        )
+        assert c.get("/cms/log", headers=inspector).status_code == 401
+        monkeypatch.undo()
+
+        # 收回权限后立即生效
+        c.post(
+            "/cms/admin/permission/remove",
+            headers=headers,
+            json={"group_id": gid, "permission_ids": [permission_id]},
+        )
+        assert c.get("/cms/log", headers=inspector).status_code == 401
+
+
+def test_group_required_with_permission_claims(fixtureFunc, monkeypatch):
+    monkeypatch.setitem(app.config, "JWT_PERMISSION_CLAIMS", True)
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        rv = c.get("/cms/admin/permission", headers=headers).get_json()
+        permission_id = [p["id"] for p in rv["日志"] if p["name"] == "查询日志"][0]
+        c.post(
+            "/cms/admin/group",
+            headers=headers,
+            json={"name": "claimant", "info": "令牌", "permission_ids": [permission_id]},
+        )
+        groups = c.get("/cms/admin/group/all", headers=headers).get_json()
+        gid = [g["id"] for g in groups if g["name"] == "claimant"][0]
+        c.post(
+            "/cms/user/register",
+            headers=headers,
+            json={
+                "username": "claimant",
+                "password": "123456",
+                "confirm_password": "123456",
+                "group_ids": [gid],
+            },
+        )
+        rv = c.post(
+            "/cms/user/login", json={"username": "claimant", "password": "123456"}
+        )
+        claimant = {"Authorization": "Bearer " + rv.get_json()["access_token"]}
+
+        loads = list()
+        find_user = lin.find_user
+
+        def counting_find_user(**kwargs):
+            loads.append(kwargs)
+            return find_user(**kwargs)
+
+        monkeypatch.setattr(lin, "find_user", counting_find_user)
+        # 权限版本号未变，直接使用令牌中的分组，不加载用户
+        assert c.get("/cms/log", headers=claimant).status_code == 200
+        assert c.get("/cms/admin/users", headers=claimant).status_code == 401
+        assert loads == []
+
+        # 其他 worker 递增了版本号，回退到加载用户
+        acl_version.bump()
+        assert c.get("/cms/log", headers=claimant).status_code == 200
+        assert len(loads) == 1
+
+        # 回退时校验用户的激活状态
+        with monkeypatch.context() as m:
+            m.setattr(
+                User, "is_active", property(lambda self: self.username != "claimant")
+            )
+            assert c.get("/cms/log", headers=claimant).status_code == 401
+
+        # 其他 worker 收回了分组的权限，本进程的权限缓存随版本号失效
+        table = GroupPermission.__table__
+        with app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.group_id == gid))
+            acl_version.bump()
+        assert c.get("/cms/log", headers=claimant).status_code == 401
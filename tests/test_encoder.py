@@ -0,0 +1,110 @@
+"""
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import enum
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import json as flask_json
+from lin.db import MixinJSONSerializer
+from lin.encoder import JSONEncoder
+from sqlalchemy import Column, Date, DateTime, Enum, Integer, Numeric, String
+from sqlalchemy.ext.declarative import declarative_base
+
+from app.extension.serializer.encoder import (
+    BACKEND_ORJSON,
+    BACKEND_SIMPLEJSON,
+    compiled_encoder,
+    orjson,
+)
+
+from . import app
+
+Base = declarative_base()
+
+
+class Level(enum.Enum):
+    LOW = 1
+    HIGH = 2
+
+
+class Sample(MixinJSONSerializer, Base):
+    __tablename__ = "encoder_sample"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(20))
+    secret = Column(String(20))
+    level = Column(Enum(Level))
+    price = Column(Numeric(10, 2))
+    birthday = Column(Date)
+    create_time = Column(DateTime)
+
+    def _set_fields(self):
+        self._exclude = ["secret"]
+
+
+def make_sample(**attrs):
+    sample = Sample(
+        id=1,
+        name="样例",
+        secret="hidden",
+        level=Level.HIGH,
+        price=Decimal("12.50"),
+        birthday=date(2020, 2, 29),
+        create_time=datetime(2020, 3, 1, 8, 30, 15, 123456),
+    )
+    for key, value in attrs.items():
+        setattr(sample, key, value)
+    sample.init_on_load()
+    return sample
+
+
+def assert_same_as_lin(payload):
+    expected = flask_json.dumps(payload, cls=JSONEncoder)
+    backends = [BACKEND_SIMPLEJSON] + ([BACKEND_ORJSON] if orjson else [])
+    backend = compiled_encoder.config["BACKEND"]
+    try:
+        for name in backends:
+            compiled_encoder.config["BACKEND"] = name
+            output = compiled_encoder.dumps(payload)
+            assert json.loads(output) == json.loads(expected)
+            # Decimal 保留原样的数字，不转为浮点数
+            assert b"12.50" in output
+    finally:
+        compiled_encoder.config["BACKEND"] = backend
+
+
+def test_compiled_encoder_matches_lin():
+    with app.app_context():
+        sample = make_sample()
+        # 隐藏字段、动态追加的字段（枚举、Decimal、日期、嵌套对象）
+        sample.hide("birthday")
+        sample.tags = [Level.LOW, Decimal("0.10")]
+        sample.updated = datetime(2020, 3, 2)
+        sample.child = make_sample(id=2, level=None, create_time=None)
+        sample._fields.extend(["tags", "updated", "child"])
+        assert_same_as_lin(sample)
+        assert_same_as_lin(dict(total=1, items=[sample, make_sample(id=3)]))
+
+        output = json.loads(compiled_encoder.dumps(sample))
+        assert "secret" not in output and "birthday" not in output
+        assert output["create_time"] == "2020-03-01T08:30:15Z"
+        assert output["level"] == 2 and output["tags"][0] == 1
+        assert output["child"]["level"] is None
+
+
+def test_serializer_cache_is_bounded(monkeypatch):
+    serializers = compiled_encoder._serializers
+    monkeypatch.setattr(serializers, "size", 2)
+    serializers.clear()
+    with app.app_context():
+        for fields in (["id"], ["id", "name"], ["name"]):
+            sample = make_sample()
+            sample._fields = fields
+            assert json.loads(compiled_encoder.dumps(sample)) == {
+                field: getattr(sample, field) for field in fields
+            }
+    assert len(serializers) == 2
+    assert (Sample, ("id",)) not in serializers
@@ -0,0 +1,284 @@
+"""
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+import pytest
+from lin.db import db
+from lin.logger import Log
+
+from app.extension.log.partition import log_partitions
+from app.extension.log.usernames import log_usernames
+from app.extension.log.writer import LogWriter, log_writer
+
+from . import app, fixtureFunc, get_token
+
+
+def test_get_logs_by_cursor(fixtureFunc):
+    with app.test_client() as c:
+        for _ in range(3):
+            c.post(
+                "/cms/user/login",
+                json={"username": "root", "password": "123456"},
+            )
+        log_writer.flush()
+        headers = {"Authorization": "Bearer " + get_token()}
+        first = c.get("/cms/log?count=2", headers=headers).get_json()
+        assert len(first["items"]) == 2
+        assert first["next"] is not None
+
+        second = c.get(
+            "/cms/log?count=2&with_total=false&cursor=" + first["next"],
+            headers=headers,
+        ).get_json()
+        assert second["total"] is None
+        assert first["items"][-1]["id"] not in [i["id"] for i in second["items"]]
+
+        back = c.get(
+            "/cms/log?count=2&cursor=" + second["prev"], headers=headers
+        ).get_json()
+        assert [i["id"] for i in back["items"]] == [i["id"] for i in first["items"]]
+
+
+def test_get_logs_by_invalid_cursor(fixtureFunc):
+    with app.test_client() as c:
+        rv = c.get(
+            "/cms/log?cursor=invalid",
+            headers={"Authorization": "Bearer " + get_token()},
+        )
+        assert rv.status_code == 400
+
+
+def test_search_logs(fixtureFunc):
+    with app.test_client() as c:
+        log_writer.flush()
+        headers = {"Authorization": "Bearer " + get_token()}
+        for keyword in ("登陆成功", "root"):
+            rv = c.get("/cms/log/search?keyword=" + keyword, headers=headers)
+            assert rv.status_code == 200
+            items = rv.get_json()["items"]
+            assert items
+            assert all(keyword in i["message"] for i in items)
+
+
+def test_get_logs_total_after_write(fixtureFunc):
+    with app.test_client() as c:
+        log_writer.flush()
+        headers = {"Authorization": "Bearer " + get_token()}
+        total = c.get("/cms/log", headers=headers).get_json()["total"]
+        assert c.get("/cms/log", headers=headers).get_json()["total"] == total
+        c.post("/cms/user/login", json={"username": "root", "password": "123456"})
+        log_writer.flush()
+        assert c.get("/cms/log", headers=headers).get_json()["total"] == total + 1
+
+
+def test_get_users_for_log(fixtureFunc):
+    with app.test_client() as c:
+        log_writer.flush()
+        rv = c.get(
+            "/cms/log/users", headers={"Authorization": "Bearer " + get_token()}
+        )
+        assert rv.status_code == 200
+        items = rv.get_json()["items"]
+        assert "root" in items
+        assert items == sorted(set(items))
+
+
+def test_log_usernames_backfill_is_idempotent(fixtureFunc):
+    log_writer.flush()
+    with app.app_context():
+        usernames = log_usernames.all()
+        # 其他 worker 已回填时再次回填不会失败
+        log_usernames.backfill()
+        log_usernames.warm()
+        assert log_usernames.ready
+        assert log_usernames.all() == usernames
+
+
+def test_export_logs(fixtureFunc):
+    with app.test_client() as c:
+        log_writer.flush()
+        headers = {"Authorization": "Bearer " + get_token()}
+        rv = c.get("/cms/log/export?format=ndjson", headers=headers)
+        assert rv.status_code == 200
+        rows = [json.loads(line) for line in rv.data.decode("utf-8").splitlines()]
+        assert len(rows) >= 2
+
+        rv = c.get(
+            "/cms/log/export",
+            query_string={
+                "after_id": rows[0]["id"],
+                "after_time": rows[0]["create_time"],
+            },
+            headers={**headers, "Accept-Encoding": "gzip"},
+        )
+        assert rv.headers["Content-Encoding"] == "gzip"
+        lines = gzip.decompress(rv.data).decode("utf-8-sig").splitlines()
+        assert lines[0].startswith("id,message")
+        assert len(lines) == len(rows)
+
+
+def test_get_log_analytics(fixtureFunc):
+    with app.test_client() as c:
+        log_writer.flush()
+        headers = {"Authorization": "Bearer " + get_token()}
+        total = c.get("/cms/log", headers=headers).get_json()["total"]
+        rv = c.get("/cms/log/analytics?granularity=day", headers=headers)
+        assert rv.status_code == 200
+        assert sum(i["count"] for i in rv.get_json()["items"]) == total
+
+        rv = c.get(
+            "/cms/log/analytics?group_by=username,status_code", headers=headers
+        )
+        items = rv.get_json()["items"]
+        assert ("root", 200) in {(i["username"], i["status_code"]) for i in items}
+
+
+def make_writer(batches, fail=0, **config):
+    """
+    写入时只记录批次、不落库的 LogWriter，前 fail 批写入失败
+    """
+    writer = LogWriter()
+    writer.init_app(app)
+    writer.config.update(config)
+
+    def write_rows(rows):
+        if len(batches) < fail:
+            batches.append(None)
+            raise RuntimeError("database is gone")
+        batches.append([row["message"] for row in rows])
+
+    writer._write_rows = write_rows
+    return writer
+
+
+def test_log_writer_batches():
+    batches = list()
+    writer = make_writer(batches, BATCH_SIZE=3, INTERVAL=200)
+    for i in range(7):
+        writer.write(message=str(i))
+    writer.flush()
+    assert [m for batch in batches for m in batch] == [str(i) for i in range(7)]
+    assert max(len(batch) for batch in batches) == 3
+    writer.close()
+
+
+def test_log_writer_flush_at_exit():
+    batches = list()
+    writer = make_writer(batches, BATCH_SIZE=100, INTERVAL=200)
+    for i in range(5):
+        writer.write(message=str(i))
+    # 进程退出时 atexit 调用 close，后台线程未写完的日志同样会写入
+    writer.close()
+    assert [m for batch in batches for m in batch] == [str(i) for i in range(5)]
+    assert writer._queue.unfinished_tasks == 0
+
+
+def test_log_writer_flush_on_failure():
+    batches = list()
+    writer = make_writer(batches, fail=1, BATCH_SIZE=2, INTERVAL=60000)
+    for i in range(5):
+        writer._queue.put({"message": str(i)})
+    flusher = threading.Thread(target=writer.flush)
+    flusher.start()
+    flusher.join(timeout=5)
+    # 失败的批次被丢弃，其余批次照常写入，flush 不会阻塞
+    assert not flusher.is_alive()
+    assert batches == [None, ["2", "3"], ["4"]]
+    assert writer._queue.unfinished_tasks == 0
+
+
+def test_log_partitions(fixtureFunc, monkeypatch, tmp_path):
+    # 未开启分区时日志查询不读取分区表，拒绝迁移和删除
+    monkeypatch.setitem(log_partitions.config, "ENABLE", False)
+    with app.app_context():
+        for job in (log_partitions.rotate, log_partitions.purge):
+            with pytest.raises(RuntimeError):
+                job(now=datetime(2020, 4, 15))
+    monkeypatch.setitem(log_partitions.config, "ENABLE", True)
+    monkeypatch.setitem(log_partitions.config, "BATCH_SIZE", 2)
+    monkeypatch.setitem(log_partitions.config, "RETENTION", 1)
+    monkeypatch.setitem(log_partitions.config, "ARCHIVE_DIR", str(tmp_path))
+    log_writer.flush()
+    headers = {"Authorization": "Bearer " + get_token()}
+    with app.test_client() as c:
+        total = c.get("/cms/log", headers=headers).get_json()["total"]
+    rows = [
+        dict(
+            message="归档日志 %d" % i,
+            user_id=1,
+            username="archiver",
+            status_code=200,
+            method="GET",
+            path="/cms/log",
+            permission="",
+            create_time=datetime(2020, month, 10, 12, i),
+            update_time=datetime(2020, month, 10, 12, i),
+        )
+        for month in (1, 2)
+        for i in range(5 if month == 1 else 1)
+    ]
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(Log.__table__.insert(), rows)
+        assert log_partitions.rotate(now=datetime(2020, 4, 15)) == [
+            "lin_log_202001",
+            "lin_log_202002",
+        ]
+        assert log_partitions.months() == [datetime(2020, 1, 1), datetime(2020, 2, 1)]
+
+        # 筛选条件下推到每个分区，时间段早于 lin_log 中最早的日志时 lin_log 分支恒假
+        sql = str(
+            log_partitions.query(
+                "2020-01-01 00:00:00", "2020-01-31 23:59:59", "归档", "archiver"
+            ).statement
+        )
+        assert "lin_log_202001" in sql and "lin_log_202002" not in sql
+        assert re.search(r"FROM lin_log \nWHERE false UNION ALL", sql)
+        assert sql.index("LIKE") < sql.index(") AS lin_log_all")
+        # 分页时每个分支各自排序并只取本页所需的条数
+        sql = str(log_partitions.query(count=2).statement)
+        assert sql.count("ORDER BY") == sql.count("LIMIT") == 3
+        assert sql.rindex("LIMIT") < sql.index(") AS lin_log_all")
+
+    with app.test_client() as c:
+        rv = c.get(
+            "/cms/log/search",
+            query_string={
+                "start": "2020-01-01 00:00:00",
+                "end": "2020-01-31 23:59:59",
+                "keyword": "归档",
+                "count": 15,
+            },
+            headers=headers,
+        ).get_json()
+        assert rv["total"] == 5 and len(rv["items"]) == 5
+        # 按游标翻页，合并结果与一次取出的顺序一致
+        paged, query = [], dict(keyword="归档", count=2)
+        while True:
+            page = c.get(
+                "/cms/log/search", query_string=query, headers=headers
+            ).get_json()
+            paged.extend(item["id"] for item in page["items"])
+            if not page["next"]:
+                break
+            query["cursor"] = page["next"]
+        assert len(paged) == 6
+        assert paged[1:] == [item["id"] for item in rv["items"]]
+        # 日志列表同样包含已迁移到分区的日志
+        assert c.get("/cms/log", headers=headers).get_json()["total"] == total + 6
+
+    with app.app_context():
+        archived = log_partitions.purge(now=datetime(2020, 4, 15))
+        assert [os.path.basename(p) for p in archived] == ["lin_log_202001.ndjson.gz"]
+        with gzip.open(archived[0], "rt", encoding="utf-8") as f:
+            assert len(f.read().splitlines()) == 5
+        assert log_partitions.months() == [datetime(2020, 2, 1)]
+        log_partitions.table(datetime(2020, 2, 1)).drop(bind=db.engine)
+        log_partitions._months = None
@@ -0,0 +1,159 @@
+"""
+    :copyright: © 2020 by the Lin team.
+    :license: MIT, see LICENSE for more details.
+"""
+import gzip
+import json
+from datetime import timedelta
+
+from lin.db import db
+
+from app.extension.cache.conditional import table_version
+from app.extension.compress.compressor import compressor
+from app.model.btc.project import BtcProject
+
+from . import app
+
+
+def test_get_projects_cached():
+    with app.test_client() as c:
+        rv = c.get("/btc/project")
+        assert rv.status_code == 200 and rv.headers["X-Cache"] == "MISS"
+        rv = c.get("/btc/project")
+        assert rv.status_code == 200 and rv.headers["X-Cache"] == "HIT"
+        total = rv.get_json()["total"]
+        rv = c.post(
+            "/btc/project",
+            json={
+                "name": "cached",
+                "english_name": "cached",
+                "chinese_name": "缓存",
+                "detail": "detail",
+            },
+        )
+        assert rv.status_code == 200
+        rv = c.get("/btc/project")
+        assert rv.headers["X-Cache"] == "MISS"
+        assert rv.get_json()["total"] == total + 1
+
+
+def test_get_projects_compressed():
+    with app.test_client() as c:
+        c.post(
+            "/btc/project",
+            json={
+                "name": "compressed",
+                "english_name": "compressed",
+                "chinese_name": "压缩",
+                "detail": "<p>detail</p>" * 500,
+            },
+        )
+        rv = c.get("/btc/project", headers={"Accept-Encoding": "gzip"})
+        assert rv.status_code == 200
+        assert rv.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in rv.headers["Vary"]
+        data = json.loads(gzip.decompress(rv.data))
+        assert data == c.get("/btc/project").get_json()
+        rv = c.get(
+            "/btc/project",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": rv.headers["ETag"]},
+        )
+        assert rv.status_code == 304
+        # ETag 相同、查询参数不同的响应分别缓存压缩结果
+        compressor.clear()
+        first, second = (
+            c.get(url, headers={"Accept-Encoding": "gzip"})
+            for url in ("/btc/project", "/btc/project?exclude=info_table")
+        )
+        assert first.headers["ETag"] == second.headers["ETag"]
+        assert first.data != second.data and len(compressor) == 2
+
+
+def test_get_projects_fields():
+    with app.test_client() as c:
+        rv = c.get("/btc/project?fields=name,id")
+        assert rv.status_code == 200
+        assert all(sorted(p) == ["id", "name"] for p in rv.get_json()["items"])
+        rv = c.get("/btc/project?exclude=detail,info_table")
+        assert rv.status_code == 200
+        assert all("detail" not in p and "name" in p for p in rv.get_json()["items"])
+        rv = c.get("/btc/project?fields=name,secret")
+        assert rv.status_code == 400
+
+
+def test_get_projects_paginated():
+    with app.test_client() as c:
+        for i in range(3):
+            c.post(
+                "/btc/project",
+                json={
+                    "name": "page{i}".format(i=i),
+                    "english_name": "page",
+                    "chinese_name": "分页",
+                    "detail": "detail",
+                },
+            )
+        page = c.get("/btc/project?count=2").get_json()
+        assert len(page["items"]) == 2 and page["next"] and page["prev"] is None
+        ids = [p["id"] for p in page["items"]]
+        while page["next"]:
+            page = c.get(
+                "/btc/project?count=2&cursor={cursor}".format(cursor=page["next"])
+            ).get_json()
+            ids.extend(p["id"] for p in page["items"])
+        assert ids == sorted(ids) and len(ids) == page["total"]
+        assert c.get("/btc/project?sort=name").status_code == 400
+
+        # 按排名排序时未设置排名的项目排在最后，游标可以定位到 NULL 之后
+        with app.app_context():
+            for rang, ident in ((2, ids[0]), (1, ids[1])):
+                BtcProject.query.get(ident).rang = rang
+            db.session.commit()
+        page = c.get("/btc/project?sort=rang&count=2").get_json()
+        assert page["page"] == 0
+        pages, ranked = [page], [p["id"] for p in page["items"]]
+        while page["next"]:
+            url = "/btc/project?sort=rang&count=2&cursor={cursor}"
+            page = c.get(url.format(cursor=page["next"])).get_json()
+            assert "page" not in page
+            pages.append(page)
+            ranked.extend(p["id"] for p in page["items"])
+        assert ranked == [ids[1], ids[0]] + sorted(ids[2:])
+        # 从最后一页向前翻页，以及从排名为 NULL 的段翻回有排名的段
+        url = "/btc/project?sort=rang&count=2&cursor={cursor}"
+        page = c.get(url.format(cursor=pages[-1]["prev"])).get_json()
+        assert page["items"] == pages[-2]["items"]
+        page = c.get(url.format(cursor=pages[1]["prev"])).get_json()
+        assert page["items"] == pages[0]["items"] and page["prev"] is None
+        # 按页码定位到排名为 NULL 的段
+        page = c.get("/btc/project?sort=rang&count=2&page=1").get_json()
+        assert page["items"] == pages[1]["items"]
+
+
+def test_table_version_changes():
+    with app.test_client() as c:
+        for name in ("etag0", "etag1"):
+            c.post(
+                "/btc/project",
+                json={
+                    "name": name,
+                    "english_name": name,
+                    "chinese_name": "版本",
+                    "detail": "detail",
+                },
+            )
+    version = table_version(BtcProject)
+    with app.app_context():
+        etag, last_modified = version()
+        first = BtcProject.query.filter_by(name="etag0").first()
+        # 同一秒内的修改
+        first.update_time = last_modified + timedelta(microseconds=1)
+        db.session.commit()
+        assert version()[0] != etag
+        # 物理删除非最大 id 的行，max(update_time) 与 max(id) 不变
+        first.update_time = last_modified
+        db.session.commit()
+        etag = version()[0]
+        BtcProject.query.filter_by(name="etag0").delete()
+        db.session.commit()
+        assert version()[0] != etag
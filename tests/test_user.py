@@ -2,9 +2,13 @@
     :copyright: © 2020 by the Lin team.
     :license: MIT, see LICENSE for more details.
 """
+import threading
 
+from app.extension.password.hasher import password_hasher
+from app.model.lin import User
 
 from . import app, fixtureFunc, get_token
+from .config import password, username
 
 
 def test_change_nickname(fixtureFunc):
@@ -15,3 +19,99 @@ def test_change_nickname(fixtureFunc):
             json={"nickname": "tester"},
         )
         assert rv.status_code == 201
+
+
+def test_get_allowed_apis(fixtureFunc):
+    with app.test_client() as c:
+        rv = c.get(
+            "/cms/user/permissions",
+            headers={"Authorization": "Bearer " + get_token()},
+        )
+        assert rv.status_code == 200
+        json_data = rv.get_json()
+        assert json_data.get("admin") is True
+        assert isinstance(json_data.get("permissions"), list)
+
+
+def test_get_information_conditional(fixtureFunc):
+    with app.test_client() as c:
+        headers = {"Authorization": "Bearer " + get_token()}
+        rv = c.get("/cms/user/information", headers=headers)
+        assert rv.status_code == 200 and rv.headers["ETag"]
+        etag = rv.headers["ETag"]
+        rv = c.get(
+            "/cms/user/information", headers={**headers, "If-None-Match": etag}
+        )
+        assert rv.status_code == 304 and not rv.data
+        c.put("/cms/user", headers=headers, json={"nickname": "etag"})
+        rv = c.get(
+            "/cms/user/information", headers={**headers, "If-None-Match": etag}
+        )
+        assert rv.status_code == 200
+        assert rv.get_json()["nickname"] == "etag"
+
+
+def test_rehash_on_login(fixtureFunc):
+    config = app.config["PASSWORD_HASH"]
+
+    def login():
+        with app.test_client() as c:
+            rv = c.post(
+                "/cms/user/login", json={"username": username, "password": password}
+            )
+            assert rv.status_code == 200
+        with app.app_context():
+            return User.query.filter_by(username=username).first().password
+
+    app.config["PASSWORD_HASH"] = dict(config, SCHEME="scrypt", PARAMS={"N": 1024})
+    try:
+        assert login().startswith("scrypt:1024:8:1$")
+        # 成本参数未变时不会重复哈希
+        credential = login()
+        assert login() == credential
+    finally:
+        app.config["PASSWORD_HASH"] = config
+    assert login().startswith("pbkdf2:sha256:150000$")
+
+
+def test_password_hasher_executor():
+    config = app.config["PASSWORD_HASH"]
+
+    def thread_name():
+        return threading.current_thread().name
+
+    try:
+        with app.app_context():
+            for executor in ("thread", None):
+                app.config["PASSWORD_HASH"] = dict(
+                    config, EXECUTOR=executor, PARAMS={"ITERATIONS": 1000}
+                )
+                pwhash = password_hasher.hash("123456")
+                assert pwhash.startswith("pbkdf2:sha256:1000$")
+                assert password_hasher.verify(pwhash, "123456")
+                assert not password_hasher.verify(pwhash, "654321")
+                name = password_hasher._run(thread_name)
+                assert name.startswith("password") == (executor == "thread")
+    finally:
+        app.config["PASSWORD_HASH"] = config
+
+
+def test_password_hasher_hash_many():
+    config = app.config["PASSWORD_HASH"]
+    try:
+        with app.app_context():
+            for executor in (None, "thread"):
+                app.config["PASSWORD_HASH"] = dict(
+                    config, EXECUTOR=executor, PARAMS={"ITERATIONS": 1000}
+                )
+                password_hasher.shutdown()
+                hashes = password_hasher.hash_many(["a12345", "b12345"])
+                # 按 EXECUTOR 配置选择执行方式，不再固定使用进程池
+                assert list(password_hasher._executors) == (
+                    ["thread"] if executor else []
+                )
+                assert password_hasher.verify(hashes[0], "a12345")
+                assert password_hasher.verify(hashes[1], "b12345")
+    finally:
+        app.config["PASSWORD_HASH"] = config
+        password_hasher.shutdown()